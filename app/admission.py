@@ -0,0 +1,199 @@
+"""Admission control for expensive work: bounded concurrency, queueing and shedding.
+
+Work is admitted through named lanes that share ``ADMISSION_MAX_INFLIGHT``
+slots. Each lane has its own in-flight cap, a bounded FIFO wait queue and a
+wait deadline. When a slot frees up, waiting lanes are served in priority
+order, so dashboard data requests (``data``) go ahead of chat queries
+(``chat``). Chat is also capped well below the shared capacity, so LLM calls
+holding threadpool threads for seconds cannot starve the dashboard.
+
+A request arriving at a full queue is rejected immediately (429); one that
+waits past its lane's deadline is rejected with 503. Both carry a
+``retry_after`` estimate from the lane's recent service times.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.config import (
+    ADMISSION_CHAT_MAX_INFLIGHT,
+    ADMISSION_CHAT_QUEUE,
+    ADMISSION_CHAT_TIMEOUT,
+    ADMISSION_DATA_QUEUE,
+    ADMISSION_DATA_TIMEOUT,
+    ADMISSION_MAX_INFLIGHT,
+)
+from app.metrics import ADMISSION_DECISIONS, ADMISSION_INFLIGHT, ADMISSION_QUEUED, ADMISSION_WAIT
+
+_SERVICE_EWMA_ALPHA = 0.2
+_MAX_RETRY_AFTER = 120
+
+
+class Overloaded(Exception):
+    """Request rejected by admission control."""
+
+    def __init__(self, lane: str, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.lane = lane
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class Lane:
+    """Per-lane limits and state."""
+
+    def __init__(self, name: str, priority: int, max_inflight: int, max_queue: int, timeout: float,
+                 service_estimate: float = 1.0):
+        self.name = name
+        self.priority = priority  # lower is served first
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.inflight = 0
+        self.waiters: deque["_Waiter"] = deque()
+        self.service_time = service_estimate  # EWMA seconds
+
+
+class _Waiter:
+    __slots__ = ("future", "loop", "granted", "abandoned")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+        self.abandoned = False
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionController:
+    """Shared slots, per-lane caps and priority-ordered wait queues."""
+
+    def __init__(self, capacity: int, lanes: list[Lane]):
+        self.capacity = capacity
+        self.lanes = {lane.name: lane for lane in lanes}
+        self._order = sorted(lanes, key=lambda lane: lane.priority)
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    # -- internals (call with the lock held) -------------------------------
+
+    def _has_room(self, lane: Lane) -> bool:
+        return self.inflight < self.capacity and lane.inflight < lane.max_inflight
+
+    def _queued(self, lane: Lane) -> int:
+        return sum(1 for w in lane.waiters if not w.abandoned)
+
+    def _ahead_of(self, lane: Lane) -> bool:
+        """Whether anyone of equal or higher priority is already waiting."""
+        return any(self._queued(other) for other in self._order if other.priority <= lane.priority)
+
+    def _grant(self, lane: Lane) -> None:
+        lane.inflight += 1
+        self.inflight += 1
+        ADMISSION_INFLIGHT.set(lane.inflight, lane=lane.name)
+
+    def _dispatch(self) -> None:
+        for lane in self._order:
+            while lane.waiters and self._has_room(lane):
+                waiter = lane.waiters.popleft()
+                if waiter.abandoned:
+                    continue
+                waiter.granted = True
+                self._grant(lane)
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            ADMISSION_QUEUED.set(self._queued(lane), lane=lane.name)
+
+    def _retry_after(self, lane: Lane) -> int:
+        backlog = self._queued(lane) + lane.inflight + 1
+        estimate = backlog * lane.service_time / max(1, lane.max_inflight)
+        return max(1, min(_MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    # -- public API ----------------------------------------------------------
+
+    async def acquire(self, name: str, timeout: float | None = None) -> None:
+        """Wait for a slot in lane ``name``; raise Overloaded if shed or timed out."""
+        lane = self.lanes[name]
+        start = time.perf_counter()
+        with self._lock:
+            if self._has_room(lane) and not self._ahead_of(lane):
+                self._grant(lane)
+                ADMISSION_DECISIONS.inc(lane=name, outcome="admitted")
+                ADMISSION_WAIT.observe(0.0, lane=name)
+                return
+            if self._queued(lane) >= lane.max_queue:
+                ADMISSION_DECISIONS.inc(lane=name, outcome="shed")
+                raise Overloaded(name, 429, self._retry_after(lane), "Server busy: request queue is full.")
+            waiter = _Waiter(asyncio.get_running_loop())
+            lane.waiters.append(waiter)
+            ADMISSION_QUEUED.set(self._queued(lane), lane=name)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), lane.timeout if timeout is None else timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if not waiter.granted:
+                    waiter.abandoned = True
+                    ADMISSION_QUEUED.set(self._queued(lane), lane=name)
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    ADMISSION_DECISIONS.inc(lane=name, outcome="timeout")
+                    raise Overloaded(name, 503, self._retry_after(lane), "Server busy: timed out waiting for capacity.")
+            if isinstance(e, asyncio.CancelledError):
+                # Slot was granted as we were cancelled: hand it back
+                self.release(name, 0.0)
+                raise
+        ADMISSION_DECISIONS.inc(lane=name, outcome="queued")
+        ADMISSION_WAIT.observe(time.perf_counter() - start, lane=name)
+
+    def release(self, name: str, service_time: float | None = None) -> None:
+        lane = self.lanes[name]
+        with self._lock:
+            lane.inflight -= 1
+            self.inflight -= 1
+            ADMISSION_INFLIGHT.set(lane.inflight, lane=name)
+            if service_time:
+                lane.service_time += _SERVICE_EWMA_ALPHA * (service_time - lane.service_time)
+            self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, name: str, timeout: float | None = None):
+        """``async with controller.slot("chat"):`` runs the block under admission."""
+        await self.acquire(name, timeout)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(name, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "inflight": self.inflight,
+                "lanes": {
+                    lane.name: {
+                        "inflight": lane.inflight,
+                        "max_inflight": lane.max_inflight,
+                        "queued": self._queued(lane),
+                        "max_queue": lane.max_queue,
+                        "timeout_s": lane.timeout,
+                        "service_time_s": round(lane.service_time, 3),
+                    }
+                    for lane in self._order
+                },
+            }
+
+
+admission = AdmissionController(ADMISSION_MAX_INFLIGHT, [
+    Lane("data", 0, ADMISSION_MAX_INFLIGHT, ADMISSION_DATA_QUEUE, ADMISSION_DATA_TIMEOUT, service_estimate=0.2),
+    Lane("chat", 1, ADMISSION_CHAT_MAX_INFLIGHT, ADMISSION_CHAT_QUEUE, ADMISSION_CHAT_TIMEOUT, service_estimate=3.0),
+])
@@ -1,23 +1,53 @@
-"""Fast single-call LLM approach: one LLM call returns a chart spec, we build it server-side."""
+"""Fast single-call LLM approach: one LLM call returns a chart spec, we build it server-side.
+
+Plotly and LangChain are imported on first use, so importing the app stays
+fast; the startup warm-up (app.warmup) renders one chart to load Plotly
+before the server reports ready.
+"""
 
 import json
 import traceback
-import plotly.express as px
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
 import pandas as pd
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
-from app.config import OPENAI_API_KEY, LLM_MODEL, LLM_TEMPERATURE
-from app.data import load_dataframe, get_summary_text
+from app.config import OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MODEL, LLM_TEMPERATURE
+from app.data import dataset_version, load_dataframe, get_summary_text, register_dataset_cache
+from app.intents import route_query
+from app.metrics import (
+    CHART_BYTES, CHART_ERRORS, HISTORY_COMPACTED, LLM_CALLS, LLM_TOKENS, PROMPT_TOKENS, stage,
+)
+from app.prompt import compact_history, count_tokens
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 
 # ---------------------------------------------------------------------------
 # Chart builder — no LLM, just executes the spec
 # ---------------------------------------------------------------------------
 
-def build_chart_from_spec(spec: dict) -> str | None:
-    """Build a Plotly chart JSON string from a spec dict produced by the LLM."""
-    df = load_dataframe()
+def _heatmap(data_frame, x, y, z="value", title=None, labels=None, color=None):
+    """Heatmap from long-form (x, y, z) rows, one row per cell."""
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    fig = go.Figure(go.Heatmap(
+        x=data_frame[x], y=data_frame[y], z=data_frame[z],
+        colorscale="Viridis", colorbar={"title": labels.get(z, z)},
+    ))
+    fig.update_layout(title=title, xaxis_title=labels.get(x, x), yaxis_title=labels.get(y, y))
+    return fig
+
+
+def build_chart_from_spec(spec: dict, df: pd.DataFrame | None = None) -> str | None:
+    """Build a Plotly chart JSON string from a spec dict produced by the LLM.
+
+    ``df`` defaults to the loaded dataset.
+    """
+    if df is None:
+        df = load_dataframe()
 
     chart_type = spec.get("chart_type", "line")
     title = spec.get("title", "Chart")
@@ -29,12 +59,16 @@ def build_chart_from_spec(spec: dict) -> str | None:
 
     try:
         local_ns: dict = {}
-        exec(f"__chart_df__ = {data_code}", {"pd": pd, "df": df}, local_ns)
+        with stage("data_code"):
+            exec(f"__chart_df__ = {data_code}", {"pd": pd, "df": df}, local_ns)
         chart_df = local_ns["__chart_df__"]
     except Exception as e:
         print(f"[chart] data_code error: {e}")
+        CHART_ERRORS.inc(step="data_code")
         return None
 
+    import plotly.express as px
+
     chart_fn_map = {
         "line": px.line,
         "bar": px.bar,
@@ -42,6 +76,7 @@ def build_chart_from_spec(spec: dict) -> str | None:
         "area": px.area,
         "histogram": px.histogram,
         "box": px.box,
+        "heatmap": _heatmap,
     }
     chart_fn = chart_fn_map.get(chart_type, px.line)
 
@@ -51,16 +86,23 @@ def build_chart_from_spec(spec: dict) -> str | None:
             params["labels"] = labels
         if color:
             params["color"] = color
-        fig = chart_fn(**params)
-        fig.update_layout(
-            template="plotly_white",
-            font=dict(family="Inter, sans-serif", size=12),
-            title_font_size=16,
-            margin=dict(l=40, r=40, t=60, b=40),
-        )
-        return fig.to_json()
+        if chart_type == "heatmap":
+            params["z"] = spec.get("z", "value")
+        with stage("chart_build"):
+            fig = chart_fn(**params)
+            fig.update_layout(
+                template="plotly_white",
+                font=dict(family="Inter, sans-serif", size=12),
+                title_font_size=16,
+                margin=dict(l=40, r=40, t=60, b=40),
+            )
+        with stage("chart_serialize"):
+            chart_json = fig.to_json()
+        CHART_BYTES.observe(len(chart_json))
+        return chart_json
     except Exception as e:
         print(f"[chart] plotting error: {e}")
+        CHART_ERRORS.inc(step="plotting")
         return None
 
 
@@ -91,31 +133,108 @@ DATA CODE EXAMPLES:
 RESPOND WITH JSON ONLY. Respond explanation in the same language the user writes in."""
 
 
+@lru_cache(maxsize=64)
+def build_cached_chart(spec_json: str) -> str | None:
+    """``build_chart_from_spec`` memoized on the spec's JSON (for fixed fast-path specs)."""
+    return build_chart_from_spec(json.loads(spec_json))
+
+
+register_dataset_cache("build_cached_chart", build_cached_chart)
+
+
 # ---------------------------------------------------------------------------
 # Single-call query
 # ---------------------------------------------------------------------------
 
-def run_agent_query(user_query: str, chat_history: list | None = None) -> dict:
-    """Run a user query with a single LLM call and build chart server-side."""
-    llm = ChatOpenAI(
+@lru_cache(maxsize=4)
+def system_prompt(version: str) -> str:
+    """SYSTEM_PROMPT with the dataset summary, rendered once per dataset version.
+
+    Sent byte-identical on every request for a given dataset so the provider's
+    prompt-prefix cache applies.
+    """
+    return SYSTEM_PROMPT.replace("{data_summary}", get_summary_text())
+
+
+register_dataset_cache("system_prompt", system_prompt)
+
+
+def make_llm() -> "ChatOpenAI":
+    """Chat model client for the agent."""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
         model=LLM_MODEL,
         temperature=LLM_TEMPERATURE,
         openai_api_key=OPENAI_API_KEY,
+        base_url=OPENAI_BASE_URL or None,
     )
 
-    data_summary = get_summary_text()
-    system_msg = SYSTEM_PROMPT.replace("{data_summary}", data_summary)
 
-    messages: list = [SystemMessage(content=system_msg)]
+def run_agent_query(
+    user_query: str,
+    chat_history: list[dict] | None = None,
+    *,
+    llm: "ChatOpenAI | None" = None,
+    df: pd.DataFrame | None = None,
+) -> dict:
+    """Run a user query with a single LLM call and build chart server-side.
+
+    Common questions recognized by ``app.intents`` are answered from cached
+    aggregates without calling the LLM (unless they refer back to the
+    conversation). ``chat_history`` holds
+    ``{"role", "content"}`` dicts; it is compacted to the history token budget.
+    Batches pass a shared ``llm`` client and dataset snapshot ``df``.
+    """
+    with stage("intent_router"):
+        routed = route_query(user_query, chat_history)
+        if routed is not None:
+            _intent, spec, explanation = routed
+            chart_json = build_cached_chart(json.dumps(spec, sort_keys=True))
+    if routed is not None:
+        return {"explanation": explanation, "chart_json": chart_json, "error": None}
+
+    if llm is None:
+        llm = make_llm()
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
-    if chat_history:
-        for msg in chat_history:
-            messages.append(msg)
+    with stage("prompt"):
+        system_msg = system_prompt(dataset_version() if df is None else df.attrs["version"])
+        summary, history = compact_history(chat_history)
 
-    messages.append(HumanMessage(content=user_query))
+        messages: list = [SystemMessage(content=system_msg)]
+        if summary:
+            messages.append(SystemMessage(content=summary))
+        for msg in history:
+            cls = HumanMessage if msg["role"] == "user" else AIMessage
+            messages.append(cls(content=msg["content"]))
+        messages.append(HumanMessage(content=user_query))
+
+        parts = {
+            "system": count_tokens(system_msg),
+            "summary": count_tokens(summary or ""),
+            "history": sum(count_tokens(m["content"]) for m in history),
+            "query": count_tokens(user_query),
+        }
+        parts["total"] = sum(parts.values())
+        for part, tokens in parts.items():
+            PROMPT_TOKENS.observe(tokens, part=part)
+        if chat_history:
+            HISTORY_COMPACTED.inc(len(chat_history) - len(history))
 
     try:
-        response = llm.invoke(messages)
+        try:
+            with stage("llm"):
+                response = llm.invoke(messages)
+        except Exception:
+            LLM_CALLS.inc(outcome="error")
+            raise
+        LLM_CALLS.inc(outcome="ok")
+        usage = getattr(response, "usage_metadata", None) or {}
+        LLM_TOKENS.inc(usage.get("input_tokens", 0), kind="prompt")
+        LLM_TOKENS.inc(usage.get("output_tokens", 0), kind="completion")
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        LLM_TOKENS.inc(cached, kind="cached_prompt")
         raw = response.content.strip()
 
         # Strip markdown code fences if present
@@ -128,7 +247,7 @@ def run_agent_query(user_query: str, chat_history: list | None = None) -> dict:
         explanation = parsed.get("explanation", "")
         chart_spec = parsed.get("chart_spec", {})
 
-        chart_json = build_chart_from_spec(chart_spec) if chart_spec else None
+        chart_json = build_chart_from_spec(chart_spec, df) if chart_spec else None
 
         return {
             "explanation": explanation,
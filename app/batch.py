@@ -0,0 +1,56 @@
+"""Concurrent execution of a batch of agent queries (``/api/query/batch``).
+
+All items share one dataset snapshot (and therefore one cached system
+prompt) and one LLM client. At most ``concurrency`` items run at once, and
+LLM-bound items also go through the chat admission lane. Results are
+yielded in completion order, each tagged with its index. An item that
+fails produces an error result instead of failing the batch.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator
+
+from app.admission import admission
+from app.agent import make_llm, run_agent_query
+from app.data import load_dataframe
+from app.intents import can_route
+from app.singleflight import normalize_query, single_flight
+
+
+async def run_batch(queries: list[str], concurrency: int) -> AsyncIterator[dict]:
+    """Yield one result dict per query as each completes."""
+    df = load_dataframe()
+    try:
+        llm = make_llm()
+    except Exception:
+        llm = None  # each item retries and reports the error itself
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int, query: str) -> dict:
+        async with semaphore:
+            start = time.perf_counter()
+            if not query.strip():
+                result = {"explanation": "", "chart_json": None, "error": "Query cannot be empty."}
+            else:
+                try:
+                    result = await single_flight.do(
+                        "run_agent_query", (normalize_query(query), ""), run_agent_query, query, llm=llm, df=df,
+                        guard=None if can_route(query) else (lambda: admission.slot("chat")),
+                    )
+                except Exception as e:
+                    result = {"explanation": "", "chart_json": None, "error": str(e)}
+            return {
+                "index": index,
+                "query": query,
+                **result,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+
+    tasks = [asyncio.ensure_future(one(i, q)) for i, q in enumerate(queries)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -7,7 +7,50 @@ load_dotenv()
 
 OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 PARQUET_PATH: str = os.getenv("PARQUET_PATH", "availability_clean.parquet")
+OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")  # e.g. a local fake LLM for load tests
 LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
 LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0"))
 API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
 API_PORT: int = int(os.getenv("API_PORT", "8000"))
+
+# Chat prompt size: history beyond the budget is compacted into a summary
+HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_SUMMARY_TOKENS: int = int(os.getenv("HISTORY_SUMMARY_TOKENS", "200"))
+
+# Chat fast path (app.intents); set to 0 to send every question to the LLM, e.g. in load tests
+INTENT_ROUTER_ENABLED: bool = os.getenv("INTENT_ROUTER_ENABLED", "1") != "0"
+
+# /api/query/batch
+BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", "50"))
+
+# Admission control: shared slots, chat capped below them, bounded queues (seconds for timeouts)
+ADMISSION_MAX_INFLIGHT: int = int(os.getenv("ADMISSION_MAX_INFLIGHT", "16"))
+ADMISSION_CHAT_MAX_INFLIGHT: int = int(os.getenv("ADMISSION_CHAT_MAX_INFLIGHT", "4"))
+ADMISSION_CHAT_QUEUE: int = int(os.getenv("ADMISSION_CHAT_QUEUE", "16"))
+ADMISSION_CHAT_TIMEOUT: float = float(os.getenv("ADMISSION_CHAT_TIMEOUT", "30"))
+ADMISSION_DATA_QUEUE: int = int(os.getenv("ADMISSION_DATA_QUEUE", "64"))
+ADMISSION_DATA_TIMEOUT: float = float(os.getenv("ADMISSION_DATA_TIMEOUT", "10"))
+
+# Shared memory-mapped dataset for multi-worker deployments (disabled when empty)
+SHARED_DATASET_DIR: str = os.getenv("SHARED_DATASET_DIR", "")
+SHARED_POLL_SECONDS: float = float(os.getenv("SHARED_POLL_SECONDS", "5"))
+
+# Incident detection
+INCIDENT_DROP_RATIO: float = float(os.getenv("INCIDENT_DROP_RATIO", "0.7"))
+INCIDENT_MIN_SAMPLES: int = int(os.getenv("INCIDENT_MIN_SAMPLES", "3"))
+INCIDENT_GAP_SECONDS: int = int(os.getenv("INCIDENT_GAP_SECONDS", "60"))
+INCIDENT_MAX_GAP_SECONDS: int = int(os.getenv("INCIDENT_MAX_GAP_SECONDS", "14400"))
+
+# Dashboard time-series point budget (see DATA_REFERENCE.md §10)
+DEFAULT_MAX_POINTS: int = int(os.getenv("DEFAULT_MAX_POINTS", "2000"))
+
+# Live WebSocket channel
+LIVE_QUEUE_SIZE: int = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+LIVE_REPLAY_SECONDS: float = float(os.getenv("LIVE_REPLAY_SECONDS", "0"))
+
+# Per-request profiling (disabled unless PROFILE_TOKEN is set)
+PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", ".profiles")
+PROFILE_MAX_FILES: int = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
@@ -1,22 +1,104 @@
 """Data loading and summary generation for the availability parquet dataset."""
 
+import base64
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 from functools import lru_cache
-from app.config import PARQUET_PATH
+from typing import Callable
+from app.config import DEFAULT_MAX_POINTS, PARQUET_PATH, SHARED_DATASET_DIR
+from app.metrics import DATASET_LOAD_SECONDS, register_cache, stage
 
+# Rollup levels from DATA_REFERENCE.md §10, finest first
+ROLLUP_LEVELS: list[tuple[str, pd.Timedelta]] = [
+    ("10s", pd.Timedelta(seconds=10)),
+    ("1min", pd.Timedelta(minutes=1)),
+    ("5min", pd.Timedelta(minutes=5)),
+    ("15min", pd.Timedelta(minutes=15)),
+    ("1h", pd.Timedelta(hours=1)),
+    ("1D", pd.Timedelta(days=1)),
+]
 
-@lru_cache(maxsize=1)
-def load_dataframe() -> pd.DataFrame:
-    """Load the parquet file into a pandas DataFrame (cached)."""
-    df = pd.read_parquet(PARQUET_PATH)
+
+def read_clean_dataframe(path: str | None = None) -> pd.DataFrame:
+    """Read the parquet file and normalize it (stripped column names, time order)."""
+    df = pd.read_parquet(path or PARQUET_PATH)
     # Normalize column names for easier agent usage
     df.columns = [c.strip() for c in df.columns]
+    # Chronological order so "latest" rows and time slicing are well defined
+    return df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+@lru_cache(maxsize=1)
+def load_dataframe() -> pd.DataFrame:
+    """Load the dataset into a pandas DataFrame (cached).
+
+    With SHARED_DATASET_DIR set, the frame is a read-only, zero-copy view of
+    the memory-mapped Arrow file shared by all workers (see app.shared).
+    """
+    start = time.perf_counter()
+    if SHARED_DATASET_DIR:
+        from app.shared import map_dataset
+        df = map_dataset()
+    else:
+        df = read_clean_dataframe()
+        df.attrs["version"] = _fingerprint(df)
+    DATASET_LOAD_SECONDS.set(time.perf_counter() - start)
     return df
 
 
-def get_data_summary() -> dict:
-    """Generate a human-readable summary of the dataset for the agent context."""
-    df = load_dataframe()
+register_cache("load_dataframe", load_dataframe)
+
+# lru_caches holding values derived from the loaded dataset
+_dataset_caches: list[Callable] = []
+
+
+def register_dataset_cache(name: str, fn: Callable) -> None:
+    """Register a dataset-derived ``lru_cache`` so ``reload_dataset`` clears it."""
+    register_cache(name, fn)
+    _dataset_caches.append(fn)
+
+
+def reload_dataset() -> None:
+    """Drop the loaded dataset and everything cached from it."""
+    load_dataframe.cache_clear()
+    for fn in _dataset_caches:
+        fn.cache_clear()
+
+
+def _fingerprint(df: pd.DataFrame) -> str:
+    raw = f"{PARQUET_PATH}|{len(df)}|{df['timestamp'].min()}|{df['timestamp'].max()}|{int(df['value'].sum())}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def dataset_version() -> str:
+    """Short identifier of the loaded dataset; changes when different data is loaded."""
+    return load_dataframe().attrs["version"]
+
+
+def precomputed(name: str, df: pd.DataFrame):
+    """Aggregate ``name`` published with the shared dataset ``df`` (see app.shared), else None."""
+    if not SHARED_DATASET_DIR:
+        return None
+    from app.shared import shared_aggregate
+    return shared_aggregate(name, df.attrs["version"])
+
+
+def get_data_summary(df: pd.DataFrame | None = None) -> dict:
+    """Generate a human-readable summary of the dataset for the agent context.
+
+    Without ``df``, summarizes the loaded dataset (precomputed in shared mode).
+    """
+    if df is None:
+        df = load_dataframe()
+        summary = precomputed("summary", df)
+        if summary is not None:
+            return summary
 
     summary = {
         "total_rows": int(len(df)),
@@ -79,3 +161,454 @@ DESCRIPTION:
 HOURLY AVERAGES:
 {hourly}
 """
+
+
+def bucket_count(span: pd.Timedelta, step: pd.Timedelta) -> int:
+    """Number of resample buckets needed to cover ``span`` at ``step``."""
+    return int(math.floor(span / step)) + 1
+
+
+def choose_resolution(
+    span: pd.Timedelta,
+    max_points: int,
+    requested: str | None = None,
+) -> tuple[str, pd.Timedelta]:
+    """Pick the rollup level for a time range under a ``max_points`` budget.
+
+    Returns the finest level from ROLLUP_LEVELS whose bucket count fits the
+    budget (never finer than ``requested`` when given). Falls back to the
+    coarsest level if nothing fits. Raises ValueError on an invalid
+    ``requested`` frequency.
+    """
+    floor = pd.Timedelta(0)
+    if requested:
+        try:
+            floor = pd.Timedelta(requested)
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid resample frequency: {requested!r}")
+        if floor <= pd.Timedelta(0):
+            raise ValueError(f"Invalid resample frequency: {requested!r}")
+        if bucket_count(span, floor) <= max_points:
+            return requested, floor
+
+    for name, step in ROLLUP_LEVELS:
+        if step >= floor and bucket_count(span, step) <= max_points:
+            return name, step
+    return ROLLUP_LEVELS[-1]
+
+
+# ---------------------------------------------------------------------------
+# Dashboard aggregates (shared by /api/data/filtered and its delta mode)
+# ---------------------------------------------------------------------------
+
+MA_WINDOW = pd.Timedelta(minutes=5)
+
+
+def _normalize_date(value: str | None) -> str | None:
+    if not value:
+        return None
+    ts = pd.Timestamp(value)  # DateParseError is a ValueError
+    if ts.tzinfo is not None:
+        return value  # rejected by the filter like before
+    return ts.date().isoformat() if ts == ts.normalize() else ts.isoformat()
+
+
+def normalize_filters(
+    date_start: str | None = None,
+    date_end: str | None = None,
+    hour_start: int | None = None,
+    hour_end: int | None = None,
+    resample: str | None = None,
+) -> dict:
+    """Canonical form of the dashboard filters, so equivalent requests compare equal.
+
+    Dates become ISO strings, no-op bounds (hour 0/23, the 10s sampling
+    resolution) become None and ``resample`` is named after its rollup level
+    when it matches one. Raises ValueError on an invalid date or frequency.
+    """
+    if resample:
+        try:
+            step = pd.Timedelta(resample)
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid resample frequency: {resample!r}")
+        if step <= pd.Timedelta(0):
+            raise ValueError(f"Invalid resample frequency: {resample!r}")
+        names = {level_step: name for name, level_step in ROLLUP_LEVELS}
+        # Requesting the finest level is the same as not asking for one
+        resample = None if step == ROLLUP_LEVELS[0][1] else names.get(step, f"{int(step.total_seconds())}s")
+    return {
+        "date_start": _normalize_date(date_start),
+        "date_end": _normalize_date(date_end),
+        "hour_start": None if hour_start in (None, 0) else hour_start,
+        "hour_end": None if hour_end in (None, 23) else hour_end,
+        "resample": resample or None,
+    }
+
+
+def row_bounds(df: pd.DataFrame, date_start: str | None, date_end: str | None) -> tuple[int, int]:
+    """Row positions of the date range (the dataset is in time order)."""
+    tz = df["timestamp"].dt.tz
+    lo = int(df["timestamp"].searchsorted(pd.Timestamp(date_start, tz=tz))) if date_start else 0
+    hi = (
+        int(df["timestamp"].searchsorted(pd.Timestamp(date_end, tz=tz) + pd.Timedelta(days=1)))
+        if date_end else len(df)
+    )
+    return lo, hi
+
+
+def _filter_hours(df: pd.DataFrame, hour_start: int | None, hour_end: int | None) -> pd.DataFrame:
+    if hour_start is None and hour_end is None:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if hour_start is not None:
+        mask &= df["hour"] >= hour_start
+    if hour_end is not None:
+        mask &= df["hour"] <= hour_end
+    return df[mask]
+
+
+def filter_dataframe(
+    date_start: str | None = None,
+    date_end: str | None = None,
+    hour_start: int | None = None,
+    hour_end: int | None = None,
+) -> pd.DataFrame:
+    """Return the rows of the dataset matching the dashboard filters."""
+    df = load_dataframe()
+    lo, hi = row_bounds(df, date_start, date_end)
+    return _filter_hours(df.iloc[lo:hi], hour_start, hour_end)
+
+
+def filter_recent(
+    start: pd.Timestamp,
+    date_start: str | None = None,
+    date_end: str | None = None,
+    hour_start: int | None = None,
+    hour_end: int | None = None,
+) -> pd.DataFrame:
+    """``filter_dataframe`` restricted to rows at or after ``start``; reads only those rows."""
+    df = load_dataframe()
+    lo, hi = row_bounds(df, date_start, date_end)
+    lo = max(lo, int(df["timestamp"].searchsorted(start)))
+    return _filter_hours(df.iloc[lo:hi], hour_start, hour_end)
+
+
+def compute_kpis(df: pd.DataFrame) -> dict:
+    """KPI card values for a filtered window."""
+    current_value = int(df.iloc[-1]["value"])
+    avg_value = round(float(df["value"].mean()), 2)
+    max_value = int(df["value"].max())
+    std_value = round(float(df["value"].std()), 2)
+    # Uptime: % of time value > threshold (mean - 1 std as proxy)
+    threshold = max(0, avg_value - std_value)
+    uptime_pct = round(float((df["value"] > threshold).mean() * 100), 1)
+
+    return {
+        "current_stores": current_value,
+        "period_avg": avg_value,
+        "peak_max": max_value,
+        "uptime_pct": uptime_pct,
+        "threshold": round(threshold, 0),
+        "total_records": len(df),
+    }
+
+
+class WindowAggregate:
+    """Running KPI and hourly-average aggregates of a filtered window.
+
+    Delta refreshes fold only the rows since the cursor into the aggregate
+    stored for it, so their cost follows the new data, not the window size.
+    Aggregates are immutable (``add`` returns a new one) so cursor states can
+    share arrays. Mean/std use Chan's parallel update. ``uptime_pct`` must
+    count values above a moving threshold exactly, so values are kept
+    sorted: a base array from the full fetch plus a small tail of later rows.
+    """
+
+    __slots__ = ("count", "mean", "m2", "max", "hour_sum", "hour_count", "base", "tail")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max: int | None = None
+        self.hour_sum = np.zeros(24, dtype=np.float64)  # exact: integer sums stay far below 2**53
+        self.hour_count = np.zeros(24, dtype=np.int64)
+        self.base: np.ndarray | None = None
+        self.tail = np.empty(0, dtype=np.int64)
+
+    def add(self, df: pd.DataFrame) -> "WindowAggregate":
+        """New aggregate including the rows of ``df``."""
+        if len(df) == 0:
+            return self
+        values = df["value"].to_numpy(dtype=np.int64)
+        hours = df["hour"].to_numpy(dtype=np.int64)
+        n = values.size
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+
+        agg = WindowAggregate()
+        agg.count = self.count + n
+        delta = batch_mean - self.mean
+        agg.mean = self.mean + delta * n / agg.count
+        agg.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * n / agg.count
+        agg.max = int(values.max()) if self.max is None else max(self.max, int(values.max()))
+        agg.hour_sum = self.hour_sum + np.bincount(hours, weights=values, minlength=24)
+        agg.hour_count = self.hour_count + np.bincount(hours, minlength=24)
+        if self.base is None:
+            agg.base = np.sort(values)
+        else:
+            agg.base = self.base
+            agg.tail = np.sort(np.concatenate((self.tail, values)))
+        return agg
+
+    def _above(self, threshold: float) -> int:
+        above = self.tail.size - int(np.searchsorted(self.tail, threshold, side="right"))
+        if self.base is not None:
+            above += self.base.size - int(np.searchsorted(self.base, threshold, side="right"))
+        return above
+
+    def kpis(self, current: int) -> dict:
+        """Same values as ``compute_kpis`` over the aggregated rows."""
+        avg_value = round(self.mean, 2)
+        std_value = round(math.sqrt(self.m2 / (self.count - 1)), 2) if self.count > 1 else float("nan")
+        threshold = max(0, avg_value - std_value)
+        return {
+            "current_stores": int(current),
+            "period_avg": avg_value,
+            "peak_max": self.max,
+            "uptime_pct": round(self._above(threshold) / self.count * 100, 1),
+            "threshold": round(threshold, 0),
+            "total_records": self.count,
+        }
+
+    def hourly_avg(self, hours) -> list[dict]:
+        """``build_hourly_avg`` rows for ``hours``."""
+        return [
+            {"hour": int(h), "avg_value": int(round(self.hour_sum[h] / self.hour_count[h]))}
+            for h in sorted(int(h) for h in hours) if self.hour_count[h]
+        ]
+
+
+def build_time_series(
+    df: pd.DataFrame,
+    step: pd.Timedelta,
+    origin: pd.Timestamp,
+    since: pd.Timestamp | None = None,
+) -> list[dict]:
+    """Resampled mean/std series with a 5-min moving average and ±1 std band.
+
+    Buckets are anchored at ``origin`` so full and delta responses line up.
+    With ``since``, only buckets starting at or after it are returned; rows
+    from the preceding MA window are still read so the moving average matches.
+    """
+    if since is not None:
+        df = df[df["timestamp"] >= since - MA_WINDOW]
+    ts = df.set_index("timestamp")["value"].resample(step, origin=origin).agg(["mean", "std"])
+    ts.columns = ["mean", "std"]
+    ts = ts.fillna(0)  # replace all NaN with 0
+    # 5-min moving average (time-based window; a single bucket at >= 5min resolution)
+    ts["ma_5min"] = ts["mean"].rolling(MA_WINDOW, min_periods=1).mean()
+    if since is not None:
+        ts = ts[ts.index >= since]
+    ts = ts.reset_index()
+    ts["upper"] = ts["mean"] + ts["std"]
+    ts["lower"] = (ts["mean"] - ts["std"]).clip(lower=0)
+    ts["value"] = ts["mean"]  # frontend expects 'value' field
+    # Ensure no NaN/Inf in output
+    ts = ts.fillna(0).replace([float('inf'), float('-inf')], 0)
+    ts["timestamp"] = ts["timestamp"].astype(str)
+    return ts.to_dict(orient="records")
+
+
+def build_heatmap(df: pd.DataFrame) -> list[dict]:
+    """Mean value per (day, hour) cell."""
+    heatmap_df = (
+        df.assign(day=df["timestamp"].dt.date.astype(str))
+        .groupby(["day", "hour"])["value"].mean().reset_index()
+    )
+    heatmap_df["value"] = heatmap_df["value"].round(0).astype(int)
+    return heatmap_df.to_dict(orient="records")
+
+
+def build_hourly_avg(df: pd.DataFrame) -> list[dict]:
+    """Mean value per hour of day."""
+    hourly_avg_df = df.groupby("hour")["value"].mean().reset_index()
+    hourly_avg_df.rename(columns={"value": "avg_value"}, inplace=True)
+    hourly_avg_df["avg_value"] = hourly_avg_df["avg_value"].round(0).astype(int)
+    return hourly_avg_df.to_dict(orient="records")
+
+
+def bucket_start(ts: pd.Timestamp, step: pd.Timedelta, origin: pd.Timestamp) -> pd.Timestamp:
+    """Start of the ``step`` bucket (anchored at ``origin``) containing ``ts``."""
+    return origin + ((ts - origin) // step) * step
+
+
+# ---------------------------------------------------------------------------
+# Delta cursors
+# ---------------------------------------------------------------------------
+
+def filters_fingerprint(**filters) -> str:
+    """Short stable hash of the request filters a cursor is bound to."""
+    raw = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def encode_cursor(resolution: str, bucket: pd.Timestamp, fingerprint: str) -> str:
+    """Opaque URL-safe cursor pointing at the last (possibly partial) bucket."""
+    payload = {"r": resolution, "t": int(bucket.timestamp()), "f": fingerprint}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor from ``encode_cursor``. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return {"resolution": str(payload["r"]), "t": int(payload["t"]), "fingerprint": str(payload["f"])}
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# Aggregates of the rows before each recently issued cursor, keyed by
+# (dataset version, cursor); bounded, least recently used evicted first
+_CURSOR_STATES_MAX = 32
+_cursor_states: OrderedDict[tuple[str, str], tuple[WindowAggregate, pd.Timestamp]] = OrderedDict()
+_cursor_lock = threading.Lock()
+
+
+def _get_cursor_state(key: tuple[str, str]) -> tuple[WindowAggregate, pd.Timestamp] | None:
+    with _cursor_lock:
+        state = _cursor_states.get(key)
+        if state is not None:
+            _cursor_states.move_to_end(key)
+        return state
+
+
+def _put_cursor_state(key: tuple[str, str], state: tuple[WindowAggregate, pd.Timestamp]) -> None:
+    with _cursor_lock:
+        _cursor_states[key] = state
+        _cursor_states.move_to_end(key)
+        while len(_cursor_states) > _CURSOR_STATES_MAX:
+            _cursor_states.popitem(last=False)
+
+
+def filtered_payload(
+    date_start: str | None = None,
+    date_end: str | None = None,
+    hour_start: int | None = None,
+    hour_end: int | None = None,
+    resample: str | None = None,
+    max_points: int = DEFAULT_MAX_POINTS,
+    since: str | None = None,
+) -> dict:
+    """Build the /api/data/filtered response.
+
+    Raises ValueError on an invalid ``resample`` or ``since`` cursor.
+    """
+    filters = dict(date_start=date_start, date_end=date_end, hour_start=hour_start, hour_end=hour_end)
+    fingerprint = filters_fingerprint(**filters, resample=resample, max_points=max_points)
+
+    if since:
+        cursor = decode_cursor(since)
+        # A cursor from other filters or another resolution falls back to a full payload
+        if cursor["fingerprint"] == fingerprint:
+            payload = _delta_payload(cursor, since, filters, resample, max_points, fingerprint)
+            if payload is not None:
+                return payload
+
+    with stage("filter"):
+        df = filter_dataframe(**filters)
+
+    if len(df) == 0:
+        return {"time_series": [], "kpis": {}, "heatmap": [], "hourly_avg": []}
+
+    first_ts, last_ts = df["timestamp"].iloc[0], df["timestamp"].iloc[-1]
+    resolution, step = choose_resolution(last_ts - first_ts, max_points, resample)
+    origin = first_ts.floor("D")
+    next_bucket = bucket_start(last_ts, step, origin)
+    next_cursor = encode_cursor(resolution, next_bucket, fingerprint)
+
+    with stage("time_series"):
+        time_series = build_time_series(df, step, origin)
+    with stage("kpis"):
+        kpis = compute_kpis(df)
+        key = (dataset_version(), next_cursor)
+        if _get_cursor_state(key) is None:
+            settled = df.iloc[: int(df["timestamp"].searchsorted(next_bucket))]
+            _put_cursor_state(key, (WindowAggregate().add(settled), first_ts))
+    with stage("heatmap"):
+        heatmap = build_heatmap(df)
+    with stage("hourly_avg"):
+        hourly_avg = build_hourly_avg(df)
+    return {
+        "delta": False,
+        "cursor": next_cursor,
+        "time_series": time_series,
+        "resolution": resolution,
+        "kpis": kpis,
+        "heatmap": heatmap,
+        "hourly_avg": hourly_avg,
+    }
+
+
+def _delta_payload(
+    cursor: dict,
+    since: str,
+    filters: dict,
+    resample: str | None,
+    max_points: int,
+    fingerprint: str,
+) -> dict | None:
+    """Buckets/cells touched since ``cursor``, or None if a full payload is needed.
+
+    Reads only rows from the cursor's hour on and folds the rows since the
+    cursor into its stored aggregates.
+    """
+    version = dataset_version()
+    since_ts = pd.Timestamp(cursor["t"], unit="s", tz="UTC").tz_convert(load_dataframe()["timestamp"].dt.tz)
+
+    state = _get_cursor_state((version, since))
+    if state is None:
+        # Issued by another worker or evicted: rebuild once from the window
+        with stage("filter"):
+            window = filter_dataframe(**filters)
+        if len(window) == 0:
+            return None
+        settled = window.iloc[: int(window["timestamp"].searchsorted(since_ts))]
+        state = (WindowAggregate().add(settled), window["timestamp"].iloc[0])
+    agg, first_ts = state
+
+    with stage("filter"):
+        recent = filter_recent(min(since_ts.floor("h"), since_ts - MA_WINDOW), **filters)
+        new = recent[recent["timestamp"] >= since_ts]
+    if len(new) == 0:
+        return None
+    last_ts = new["timestamp"].iloc[-1]
+    resolution, step = choose_resolution(last_ts - first_ts, max_points, resample)
+    if resolution != cursor["resolution"]:
+        return None
+    origin = first_ts.floor("D")
+    next_bucket = bucket_start(last_ts, step, origin)
+    next_cursor = encode_cursor(resolution, next_bucket, fingerprint)
+
+    with stage("time_series"):
+        time_series = build_time_series(recent, step, origin, since=since_ts)
+    with stage("kpis"):
+        split = int(new["timestamp"].searchsorted(next_bucket))
+        settled = agg.add(new.iloc[:split])
+        _put_cursor_state((version, next_cursor), (settled, first_ts))
+        current = settled.add(new.iloc[split:])
+        kpis = current.kpis(new["value"].iloc[-1])
+    with stage("heatmap"):
+        heatmap = build_heatmap(recent[recent["timestamp"] >= since_ts.floor("h")])
+    with stage("hourly_avg"):
+        hourly_avg = current.hourly_avg(new["hour"].unique())
+    return {
+        "delta": True,
+        "cursor": next_cursor,
+        "resolution": resolution,
+        "time_series": time_series,
+        "kpis": kpis,
+        "heatmap": heatmap,
+        "hourly_avg": hourly_avg,
+    }
@@ -0,0 +1,116 @@
+"""Streaming raw-data export (NDJSON / CSV / Arrow IPC).
+
+Rows are serialized batch by batch from the cached DataFrame, so only one
+encoded batch is held in memory at a time regardless of the export size.
+"""
+
+import io
+from typing import Iterator
+
+import pandas as pd
+
+from app.data import load_dataframe, row_bounds
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def select_rows(
+    date_start: str | None = None,
+    date_end: str | None = None,
+    columns: list[str] | None = None,
+) -> tuple[pd.DataFrame, range, list[str]]:
+    """Resolve an export request to (df, row range, columns).
+
+    Raises ValueError on unknown columns or dates. The dataset is in time
+    order, so the date range is a contiguous row range found by binary
+    search; nothing proportional to the export size is materialized here.
+    """
+    df = load_dataframe()
+    columns = columns or list(df.columns)
+    unknown = [c for c in columns if c not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    lo, hi = row_bounds(df, date_start, date_end)
+    return df, range(lo, hi), columns
+
+
+def iter_batches(df: pd.DataFrame, rows: range, columns: list[str], batch_size: int) -> Iterator[pd.DataFrame]:
+    """Yield successive row batches of ``df`` restricted to ``columns``."""
+    for start in range(rows.start, rows.stop, batch_size):
+        yield df.iloc[start:min(start + batch_size, rows.stop)][columns]
+
+
+def _stringify_timestamps(batch: pd.DataFrame) -> pd.DataFrame:
+    # Keep the local wall-clock representation (see DATA_REFERENCE.md §3)
+    if "timestamp" in batch.columns:
+        batch = batch.assign(timestamp=batch["timestamp"].astype(str))
+    return batch
+
+
+def stream_ndjson(batches: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    """Encode batches as newline-delimited JSON."""
+    for batch in batches:
+        text = _stringify_timestamps(batch).to_json(orient="records", lines=True, force_ascii=False)
+        if text and not text.endswith("\n"):
+            text += "\n"
+        yield text.encode("utf-8")
+
+
+def stream_csv(batches: Iterator[pd.DataFrame], columns: list[str]) -> Iterator[bytes]:
+    """Encode batches as CSV with a single header row."""
+    header = True
+    for batch in batches:
+        yield batch.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+    if header:
+        yield pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8")
+
+
+def stream_arrow(batches: Iterator[pd.DataFrame], columns: list[str]) -> Iterator[bytes]:
+    """Encode batches as an Arrow IPC stream, flushing after each record batch."""
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = None
+    for batch in batches:
+        record_batch = pa.RecordBatch.from_pandas(batch, preserve_index=False)
+        if writer is None:
+            writer = pa.ipc.new_stream(sink, record_batch.schema)
+        writer.write_batch(record_batch)
+        yield _drain(sink)
+    if writer is None:
+        # Empty export: still emit a valid stream with the schema only
+        empty = load_dataframe().head(0)[columns]
+        writer = pa.ipc.new_stream(sink, pa.Schema.from_pandas(empty, preserve_index=False))
+    writer.close()
+    yield _drain(sink)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate(0)
+    return data
+
+
+def export_stream(
+    fmt: str,
+    date_start: str | None = None,
+    date_end: str | None = None,
+    columns: list[str] | None = None,
+    batch_size: int = 10_000,
+) -> Iterator[bytes]:
+    """Return a byte generator for the requested export format."""
+    df, rows, columns = select_rows(date_start, date_end, columns)
+    batches = iter_batches(df, rows, columns, batch_size)
+    if fmt == "ndjson":
+        return stream_ndjson(batches)
+    if fmt == "csv":
+        return stream_csv(batches, columns)
+    if fmt == "arrow":
+        return stream_arrow(batches, columns)
+    raise ValueError(f"Unsupported format: {fmt}")
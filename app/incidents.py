@@ -0,0 +1,340 @@
+"""Outage / incident detection over the visible-stores time series.
+
+Incidents are found with run-length encoding over NumPy boolean masks, so a
+pass is linear in the number of samples. Two kinds are reported:
+
+- ``drop``: contiguous samples whose value falls below a fraction of the
+  time-of-day baseline. The baseline is the median of each 10-second slot
+  across days, lowered to the minimum of neighbouring slots. The daily
+  ramps (06:11, 08:00, just after midnight) are step changes at fixed
+  times: they follow the baseline and are not reported.
+- ``gap``: holes in the ~10s sampling longer than ``gap_seconds``. Holes
+  longer than ``max_gap_seconds`` are the nightly monitoring window and are
+  not counted as incidents.
+
+The detector is incremental: ``update`` only scans the newly appended chunk and
+carries the still-open run across calls.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from app.config import (
+    INCIDENT_DROP_RATIO,
+    INCIDENT_GAP_SECONDS,
+    INCIDENT_MAX_GAP_SECONDS,
+    INCIDENT_MIN_SAMPLES,
+)
+from app.data import load_dataframe, precomputed, register_dataset_cache
+
+SAMPLE_SECONDS = 10
+BASELINE_SLOT_SECONDS = SAMPLE_SECONDS
+SLOTS_PER_DAY = 86_400 // BASELINE_SLOT_SECONDS
+# Slots on each side whose minimum the baseline takes (absorbs ramp timing jitter)
+BASELINE_SMOOTH_SLOTS = 1
+
+
+# ---------------------------------------------------------------------------
+# Run-length encoding helpers
+# ---------------------------------------------------------------------------
+
+def find_runs(mask: np.ndarray, breaks: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Return (starts, ends) indices of the True runs in ``mask`` (ends inclusive).
+
+    ``breaks[i]`` forces a new run to start at ``i`` even if ``mask[i - 1]``
+    is True (used to split runs across sampling gaps).
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if mask.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    prev = np.concatenate(([False], mask[:-1]))
+    nxt = np.concatenate((mask[1:], [False]))
+    if breaks is not None:
+        prev &= ~breaks
+        nxt &= ~np.concatenate((breaks[1:], [False]))
+    starts = np.flatnonzero(mask & ~prev)
+    ends = np.flatnonzero(mask & ~nxt)
+    return starts, ends
+
+
+# ---------------------------------------------------------------------------
+# Incremental detector
+# ---------------------------------------------------------------------------
+
+class IncidentDetector:
+    """Incremental drop/gap incident detector.
+
+    Timestamps are handled internally as integer wall-clock seconds and
+    converted back to the dataset timezone when incidents are reported.
+    """
+
+    def __init__(
+        self,
+        baseline: np.ndarray,
+        drop_ratio: float = INCIDENT_DROP_RATIO,
+        min_samples: int = INCIDENT_MIN_SAMPLES,
+        gap_seconds: int = INCIDENT_GAP_SECONDS,
+        max_gap_seconds: int = INCIDENT_MAX_GAP_SECONDS,
+        tz=None,
+    ):
+        self.baseline = np.asarray(baseline, dtype=np.float64)
+        self.drop_ratio = drop_ratio
+        self.min_samples = min_samples
+        self.gap_seconds = gap_seconds
+        self.max_gap_seconds = max_gap_seconds
+        self.tz = tz
+
+        self._incidents: list[dict] = []
+        self._open: dict | None = None
+        self._last_ts: int | None = None
+        self._index: pd.IntervalIndex | None = None
+        self._index_items: list[dict] = []
+
+    # -- ingestion ---------------------------------------------------------
+
+    def update(self, chunk: pd.DataFrame) -> int:
+        """Scan a chunk of new samples (``timestamp`` and ``value`` columns).
+
+        Samples at or before the last seen timestamp are ignored, so a chunk
+        may safely overlap the previous one. Returns the number of samples used.
+        """
+        if len(chunk) == 0:
+            return 0
+        if self.tz is None:
+            self.tz = chunk["timestamp"].dt.tz
+
+        ts = _to_seconds(chunk["timestamp"])
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        values = chunk["value"].to_numpy(dtype=np.float64)[order]
+
+        if self._last_ts is not None:
+            fresh = ts > self._last_ts
+            ts, values = ts[fresh], values[fresh]
+        if ts.size == 0:
+            return 0
+
+        # Gap before each sample (the first one is measured against the previous chunk)
+        prev_ts = np.concatenate(([self._last_ts if self._last_ts is not None else ts[0]], ts[:-1]))
+        deltas = ts - prev_ts
+        gap_before = deltas > self.gap_seconds
+
+        self._detect_gaps(prev_ts, ts, deltas, gap_before)
+        self._detect_drops(ts, values, gap_before)
+
+        self._last_ts = int(ts[-1])
+        self._index = None
+        return int(ts.size)
+
+    def _detect_gaps(self, prev_ts, ts, deltas, gap_before) -> None:
+        idx = np.flatnonzero(gap_before & (deltas <= self.max_gap_seconds))
+        for i in idx:
+            self._incidents.append({
+                "kind": "gap",
+                "start": int(prev_ts[i]),
+                "end": int(ts[i]),
+                "duration_s": int(deltas[i]),
+                "depth": 1.0,
+                "min_value": None,
+                "samples": 0,
+            })
+
+    def _detect_drops(self, ts, values, gap_before) -> None:
+        baseline = self.baseline[(ts % 86_400) // BASELINE_SLOT_SECONDS]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            depth = np.where(baseline > 0, 1.0 - values / baseline, 0.0)
+        below = depth > (1.0 - self.drop_ratio)
+
+        starts, ends = find_runs(below, gap_before)
+
+        # Close or extend the run left open by the previous chunk
+        if self._open is not None:
+            continues = starts.size > 0 and starts[0] == 0 and not gap_before[0]
+            if continues:
+                e = ends[0]
+                self._open["end"] = int(ts[e])
+                self._open["samples"] += int(e + 1)
+                self._open["depth"] = max(self._open["depth"], float(depth[: e + 1].max()))
+                self._open["min_value"] = min(self._open["min_value"], int(values[: e + 1].min()))
+                starts, ends = starts[1:], ends[1:]
+                if e == ts.size - 1:
+                    return
+            self._finalize(self._open)
+            self._open = None
+
+        if starts.size == 0:
+            return
+
+        # Interleave [start, end + 1) bounds so reduceat only spans each run
+        bounds = np.empty(2 * starts.size, dtype=np.int64)
+        bounds[0::2] = starts
+        bounds[1::2] = ends + 1
+        run_depth = np.maximum.reduceat(np.append(depth, -np.inf), bounds)[0::2]
+        run_min = np.minimum.reduceat(np.append(values, np.inf), bounds)[0::2]
+        for k, (s, e) in enumerate(zip(starts, ends)):
+            incident = {
+                "kind": "drop",
+                "start": int(ts[s]),
+                "end": int(ts[e]),
+                "depth": float(run_depth[k]),
+                "min_value": int(run_min[k]),
+                "samples": int(e - s + 1),
+            }
+            if e == ts.size - 1:
+                self._open = incident
+            else:
+                self._finalize(incident)
+
+    def _finalize(self, incident: dict) -> None:
+        if incident["samples"] < self.min_samples:
+            return
+        incident["duration_s"] = incident["end"] - incident["start"] + SAMPLE_SECONDS
+        self._incidents.append(incident)
+
+    # -- queries -----------------------------------------------------------
+
+    def incidents(self) -> list[dict]:
+        """Return all incidents (closed plus the ongoing one), sorted by start."""
+        items = list(self._incidents)
+        if self._open is not None and self._open["samples"] >= self.min_samples:
+            ongoing = dict(self._open)
+            ongoing["duration_s"] = ongoing["end"] - ongoing["start"] + SAMPLE_SECONDS
+            ongoing["ongoing"] = True
+            items.append(ongoing)
+        items.sort(key=lambda inc: inc["start"])
+        return items
+
+    def interval_index(self) -> pd.IntervalIndex:
+        """Closed interval index over incident [start, end] seconds (rebuilt lazily)."""
+        if self._index is None:
+            items = self.incidents()
+            self._index = pd.IntervalIndex.from_arrays(
+                [inc["start"] for inc in items],
+                [inc["end"] for inc in items],
+                closed="both",
+            )
+            self._index_items = items
+        return self._index
+
+    def query(
+        self,
+        start: pd.Timestamp | None = None,
+        end: pd.Timestamp | None = None,
+        kind: str | None = None,
+        min_duration_s: int = 0,
+    ) -> list[dict]:
+        """Return incidents overlapping [start, end], formatted for the API."""
+        index = self.interval_index()
+        items = self._index_items
+        if len(items) == 0:
+            return []
+
+        lo = _ts_to_seconds(start) if start is not None else items[0]["start"]
+        hi = _ts_to_seconds(end) if end is not None else max(inc["end"] for inc in items)
+        if hi < lo:
+            return []
+        hits = np.flatnonzero(index.overlaps(pd.Interval(lo, hi, closed="both")))
+
+        result = []
+        for i in hits:
+            inc = items[i]
+            if kind and inc["kind"] != kind:
+                continue
+            if inc["duration_s"] < min_duration_s:
+                continue
+            result.append(self._format(inc))
+        return result
+
+    def _format(self, inc: dict) -> dict:
+        return {
+            "kind": inc["kind"],
+            "start": str(self._to_timestamp(inc["start"])),
+            "end": str(self._to_timestamp(inc["end"])),
+            "duration_s": int(inc["duration_s"]),
+            "depth": round(inc["depth"], 4),
+            "min_value": inc["min_value"],
+            "samples": inc["samples"],
+            "ongoing": bool(inc.get("ongoing", False)),
+        }
+
+    def _to_timestamp(self, seconds: int) -> pd.Timestamp:
+        ts = pd.Timestamp(seconds, unit="s")
+        return ts.tz_localize(self.tz) if self.tz is not None else ts
+
+
+def _to_seconds(series: pd.Series) -> np.ndarray:
+    """Convert a (possibly tz-aware) timestamp Series to wall-clock epoch seconds."""
+    if series.dt.tz is not None:
+        series = series.dt.tz_localize(None)
+    return series.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+def build_baseline(df: pd.DataFrame, smooth: int = BASELINE_SMOOTH_SLOTS) -> np.ndarray:
+    """Time-of-day baseline: median per 10-second slot, then the minimum over
+    ``smooth`` slots on each side (wrapping around midnight); NaN where there is no data.
+    """
+    ts = _to_seconds(df["timestamp"])
+    slots = (ts % 86_400) // BASELINE_SLOT_SECONDS
+    medians = pd.Series(df["value"].to_numpy(dtype=np.float64)).groupby(slots).median()
+    baseline = np.full(SLOTS_PER_DAY, np.nan)
+    baseline[medians.index.to_numpy()] = medians.to_numpy()
+    if smooth:
+        wrapped = pd.Series(np.concatenate((baseline[-smooth:], baseline, baseline[:smooth])))
+        baseline = wrapped.rolling(2 * smooth + 1, center=True, min_periods=1).min().to_numpy()[smooth:-smooth]
+    return baseline
+
+
+def _ts_to_seconds(ts: pd.Timestamp) -> int:
+    if ts.tzinfo is not None:
+        ts = ts.tz_localize(None)
+    return int(ts.value // 1_000_000_000)
+
+
+# ---------------------------------------------------------------------------
+# Aggregates
+# ---------------------------------------------------------------------------
+
+def incident_stats(incidents: list[dict]) -> dict:
+    """MTTR / MTBF aggregates (seconds) for a list of formatted incidents."""
+    if not incidents:
+        return {"count": 0, "by_kind": {}, "mttr_s": None, "mtbf_s": None,
+                "total_downtime_s": 0, "max_depth": None}
+
+    durations = np.array([inc["duration_s"] for inc in incidents], dtype=np.float64)
+    starts = pd.to_datetime([inc["start"] for inc in incidents])
+    ends = pd.to_datetime([inc["end"] for inc in incidents])
+    # Time between the end of one incident and the start of the next
+    between = (starts[1:] - ends[:-1]).total_seconds().to_numpy()
+    between = between[between > 0]
+
+    by_kind: dict[str, int] = {}
+    for inc in incidents:
+        by_kind[inc["kind"]] = by_kind.get(inc["kind"], 0) + 1
+
+    return {
+        "count": len(incidents),
+        "by_kind": by_kind,
+        "mttr_s": round(float(durations.mean()), 1),
+        "mtbf_s": round(float(between.mean()), 1) if between.size else None,
+        "total_downtime_s": int(durations.sum()),
+        "max_depth": round(max(inc["depth"] for inc in incidents), 4),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_incident_detector() -> IncidentDetector:
+    """Build the detector over the loaded dataset (cached; shared mode publishes the baseline)."""
+    df = load_dataframe()
+    baseline = precomputed("incident_baseline", df)
+    detector = IncidentDetector(
+        baseline=build_baseline(df) if baseline is None else baseline,
+        tz=df["timestamp"].dt.tz,
+    )
+    detector.update(df[["timestamp", "value"]])
+    return detector
+
+
+register_dataset_cache("incident_detector", get_incident_detector)
@@ -0,0 +1,387 @@
+"""Deterministic fast path for the common chat questions.
+
+Most chat traffic is the frontend's example questions and close paraphrases
+of them, in English or Spanish. ``route_query`` recognizes those with
+accent-insensitive keyword rules and answers with a fixed chart spec and an
+explanation templated from cached aggregates, so no LLM call is needed.
+Questions that carry extra constraints (dates, weekdays, "between", "only",
+a particular day, a different chart type, ...) or match no rule return
+``None`` and go to the LLM as before.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable
+
+import pandas as pd
+
+from app.config import INTENT_ROUTER_ENABLED
+from app.data import load_dataframe, precomputed, register_dataset_cache
+from app.metrics import ROUTER_INTENTS, ROUTER_QUERIES, ROUTER_RATIO
+
+INTENTS = ("heatmap", "compare_days", "distribution", "peak_hour", "hourly_avg", "daily_avg", "trend")
+
+
+# ---------------------------------------------------------------------------
+# Matching
+# ---------------------------------------------------------------------------
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _has(pattern: str, text: str) -> bool:
+    return re.search(rf"\b(?:{pattern})\b", text) is not None
+
+
+# Constraints the fixed specs cannot honour: leave these to the LLM
+_CONSTRAINTS = (
+    r"between|entre|only|solo|solamente|except|excepto|without|sin|weekends?|weekdays?|fin de semana|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|lunes|martes|miercoles|jueves|viernes|"
+    r"sabado|domingo|jan\w*|feb\w*|mar|march|marzo|ene\w*|today|yesterday|hoy|ayer|minutes?|minutos?|"
+    r"weeks?|semanas?|morning|night|afternoon|evening|manana|noche|tarde|before|after|antes|despues|"
+    r"since|desde|until|hasta|table|tabla|export\w*|download|descarga\w*|why|por que|porque|predict\w*|forecast\w*|"
+    # Other statistics and the low end: the fixed specs only show averages and peaks
+    r"min|max|minim\w*|maxim\w*|lowest|least|fewest|worst|menos|menor|peor|std|stdev|standard deviation|"
+    r"desviacion|variance|varianza|median|mediana|percentile\w*|percentil\w*"
+)
+# Words pointing back at earlier turns ("that day", "the same by hour"): with
+# history, such follow-ups depend on the conversation and go to the LLM
+_REFERENCES = (
+    r"that|this|those|these|it|same|previous|above|earlier|again|instead|"
+    r"ese|esa|eso|esos|esas|este|esto|estos|mismo|misma|anterior|otra vez|de nuevo"
+)
+# Narrowing to part of the dataset ("the first day", "top 5"): only the
+# compare_days window is understood, every other fixed spec covers all days
+_POSITIONAL = (
+    r"first|last|latest|recent\w*|top|primer\w*|ultim\w*|reciente\w*|single|specific|particular|"
+    r"especific\w*|concret\w*|un solo"
+)
+# Requested chart types; a fixed spec is only used when it draws the same type
+_CHART_TYPES = (
+    ("line", r"lines?|linea\w*"),
+    ("bar", r"bars?|barras?|columns?|columnas?"),
+    ("pie", r"pie|donut|torta|pastel|dona"),
+    ("scatter", r"scatter\w*|dispersion"),
+    ("area", r"area"),
+    ("box", r"box ?plots?|boxes|cajas?|bigotes|violin"),
+    ("histogram", r"histogram|histograma"),
+    ("heatmap", r"heat ?map|mapa de calor"),
+)
+_INTENT_CHARTS = {
+    "heatmap": "heatmap", "compare_days": "line", "distribution": "histogram", "peak_hour": "bar",
+    "hourly_avg": "bar", "daily_avg": "bar", "trend": "line",
+}
+_COUNT_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "un": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6, "siete": 7,
+}
+_COUNT = r"\d+|" + "|".join(_COUNT_WORDS)
+_WINDOW_ANCHORS = {"first": r"first|primer|primeros", "last": r"last|ultimo|ultimos"}
+_AVERAGE = r"average|avg|mean|promedio|promedia\w*|media"
+_HOUR = r"hours?|hourly|hora|horas|horario|time of day"
+_DAY = r"days?|daily|dia|dias|diario|diaria|per day|por dia"
+
+_RULES: list[tuple[str, Callable[[str], bool]]] = [
+    ("heatmap", lambda t: _has(r"heat ?map|mapa de calor", t)
+        or (_has(_DAY, t) and _has(_HOUR, t) and _has(r"by|per|each|and|por|cada|y", t))),
+    ("compare_days", lambda t: _has(r"compare|comparison|versus|vs|compara\w*|comparacion", t)
+        and _has(r"first|primer\w*", t) and _has(r"last|ultim\w*", t)),
+    ("distribution", lambda t: _has(r"distribution|distributed|histogram|distribucion|histograma", t)),
+    ("peak_hour", lambda t: _has(_HOUR, t) and _has(r"peak|busiest|most|highest|pico|mas|mayor", t)),
+    ("hourly_avg", lambda t: _has(_AVERAGE, t) and _has(_HOUR, t)),
+    ("daily_avg", lambda t: _has(_AVERAGE, t) and _has(_DAY, t)),
+    ("trend", lambda t: _has(
+        r"trend|over time|time series|timeline|evolution|tendencia|a lo largo del tiempo|en el tiempo|"
+        r"evolucion|serie de tiempo|serie temporal|historico|historia", t)),
+]
+
+_ES_MARKERS = {"cual", "que", "muestra", "muestrame", "muestre", "dame", "promedio", "hora", "horas", "dia",
+               "dias", "tiendas", "de", "la", "el", "los", "las", "por", "hay", "del", "y", "compara", "mapa"}
+_EN_MARKERS = {"the", "show", "what", "which", "of", "per", "me", "is", "average", "hour", "day", "days",
+               "stores", "by", "and", "compare", "map", "give"}
+
+
+def detect_language(query: str) -> str:
+    """'es' or 'en' from marker words (and Spanish punctuation/accents)."""
+    if any(c in query for c in "¿¡ñÑ"):
+        return "es"
+    words = normalize(query).split()
+    es = sum(w in _ES_MARKERS for w in words)
+    en = sum(w in _EN_MARKERS for w in words)
+    return "es" if es > en else "en"
+
+
+def compare_window(text: str, side: str = "first") -> int | None:
+    """Day count of a "first/last N days" phrase in normalized text ("first day" is 1), else None."""
+    anchor = _WINDOW_ANCHORS[side]
+    counted = re.search(rf"\b(?:(?:{anchor})\s+({_COUNT})|({_COUNT})\s+(?:{anchor}))\s+(?:days?|dias?)\b", text)
+    if counted:
+        count = counted.group(1) or counted.group(2)
+        return int(count) if count.isdigit() else _COUNT_WORDS[count]
+    return 1 if re.search(rf"\b(?:{anchor})\s+(?:day|dia)\b", text) else None
+
+
+def match_intent(query: str) -> tuple[str, int] | None:
+    """(intent, compare-days count) for a recognized question, else None."""
+    text = normalize(query)
+    if not text or len(text.split()) > 20 or _has(_CONSTRAINTS, text):
+        return None
+    intent = next((name for name, rule in _RULES if rule(text)), None)
+    if intent is None:
+        return None
+    charts = {chart for chart, pattern in _CHART_TYPES if _has(pattern, text)}
+    if charts - {_INTENT_CHARTS[intent]}:
+        return None
+    # Numbers other than the compare window are constraints (dates, thresholds, ...)
+    digits = [int(d) for d in re.findall(r"\d+", text)]
+    if intent != "compare_days":
+        return None if digits or _has(_POSITIONAL, text) else (intent, 0)
+    # Only an explicit window is answered; a single first/last day is a specific-day question
+    n_days, last_days = compare_window(text, "first"), compare_window(text, "last")
+    if n_days is None or n_days < 2 or last_days not in (None, n_days) or any(d != n_days for d in digits):
+        return None
+    return intent, n_days
+
+
+# ---------------------------------------------------------------------------
+# Cached aggregates and answers
+# ---------------------------------------------------------------------------
+
+def compute_intent_aggregates(df: pd.DataFrame) -> dict:
+    """Plain (JSON-serializable) aggregates behind the templated explanations."""
+    dates = df["timestamp"].dt.date.astype(str)
+    values = df["value"]
+    hourly = values.groupby(df["hour"]).mean()
+    daily = values.groupby(dates).agg(["mean", "sum", "count"])
+    cells = values.groupby([dates, df["hour"]]).mean()
+    hourly_ts = df.set_index("timestamp")["value"].resample("1h").mean().dropna()
+    return {
+        "hourly": [[int(h), float(v)] for h, v in hourly.items()],
+        "daily": [[day, float(mean), int(total), int(n)] for day, mean, total, n in daily.itertuples()],
+        "cells": [[day, int(h), float(v)] for (day, h), v in cells.items()],
+        "mean": float(values.mean()),
+        "median": float(values.median()),
+        "p05": float(values.quantile(0.05)),
+        "p95": float(values.quantile(0.95)),
+        "min": int(values.min()),
+        "max": int(values.max()),
+        "hourly_low": float(hourly_ts.min()),
+        "hourly_high": float(hourly_ts.max()),
+    }
+
+
+@lru_cache(maxsize=1)
+def intent_aggregates() -> dict:
+    """Aggregates the templated explanations are built from (computed once, or published in shared mode)."""
+    df = load_dataframe()
+    plain = precomputed("intents", df) or compute_intent_aggregates(df)
+    hourly = pd.Series(dict(plain["hourly"]))
+    daily = pd.DataFrame(plain["daily"], columns=["date", "mean", "sum", "count"]).set_index("date")
+    cells = pd.Series({(day, h): v for day, h, v in plain["cells"]})
+    return {
+        **plain,
+        "days": list(daily.index),
+        "hourly": hourly,
+        "daily": daily["mean"],
+        "daily_totals": daily[["sum", "count"]],
+        "cells": cells,
+    }
+
+
+_TEXT = {
+    "hourly_avg": {
+        "en": ("Average Visible Stores by Hour",
+               "Visible stores average {mean:,.0f} across the day, from {low:,.0f} at {low_h}:00 "
+               "to {high:,.0f} at {high_h}:00."),
+        "es": ("Promedio de tiendas visibles por hora",
+               "Las tiendas visibles promedian {mean:,.0f} durante el día, desde {low:,.0f} a las {low_h}:00 "
+               "hasta {high:,.0f} a las {high_h}:00."),
+    },
+    "daily_avg": {
+        "en": ("Daily Average Visible Stores",
+               "Daily averages range from {low:,.0f} on {low_d} to {high:,.0f} on {high_d}; "
+               "the mean across days is {mean:,.0f} visible stores."),
+        "es": ("Promedio diario de tiendas visibles",
+               "Los promedios diarios van de {low:,.0f} el {low_d} a {high:,.0f} el {high_d}; "
+               "la media entre días es de {mean:,.0f} tiendas visibles."),
+    },
+    "peak_hour": {
+        "en": ("Top 10 Hours by Average Visible Stores",
+               "The peak hour is {high_h}:00 with {high:,.0f} visible stores on average; "
+               "the quietest is {low_h}:00 with {low:,.0f}."),
+        "es": ("Top 10 horas por promedio de tiendas visibles",
+               "La hora pico es las {high_h}:00 con {high:,.0f} tiendas visibles en promedio; "
+               "la más baja es las {low_h}:00 con {low:,.0f}."),
+    },
+    "distribution": {
+        "en": ("Distribution of Visible Stores",
+               "Readings range from {min:,} to {max:,} visible stores with a median of {median:,.0f}; "
+               "90% fall between {p05:,.0f} and {p95:,.0f}."),
+        "es": ("Distribución de tiendas visibles",
+               "Las lecturas van de {min:,} a {max:,} tiendas visibles con una mediana de {median:,.0f}; "
+               "el 90% está entre {p05:,.0f} y {p95:,.0f}."),
+    },
+    "heatmap": {
+        "en": ("Average Visible Stores by Day and Hour",
+               "The busiest cell is {high_d} at {high_h}:00 with {high:,.0f} stores on average; "
+               "the quietest is {low_d} at {low_h}:00 with {low:,.0f}."),
+        "es": ("Promedio de tiendas visibles por día y hora",
+               "La celda más alta es el {high_d} a las {high_h}:00 con {high:,.0f} tiendas en promedio; "
+               "la más baja es el {low_d} a las {low_h}:00 con {low:,.0f}."),
+    },
+    "compare_days": {
+        "en": ("First {n} Days vs Last {n} Days by Hour",
+               "The first {n} days average {first:,.0f} visible stores versus {last:,.0f} "
+               "in the last {n} days ({change:+.1f}%)."),
+        "es": ("Primeros {n} días vs últimos {n} días por hora",
+               "Los primeros {n} días promedian {first:,.0f} tiendas visibles frente a {last:,.0f} "
+               "en los últimos {n} días ({change:+.1f}%)."),
+    },
+    "trend": {
+        "en": ("Visible Stores Over Time (Hourly Average)",
+               "From {start} to {end}, hourly averages ranged between {low:,.0f} and {high:,.0f} visible stores; "
+               "the daily mean went from {first:,.0f} on {first_d} to {last:,.0f} on {last_d}."),
+        "es": ("Tiendas visibles en el tiempo (promedio por hora)",
+               "Del {start} al {end}, los promedios por hora variaron entre {low:,.0f} y {high:,.0f} tiendas "
+               "visibles; la media diaria pasó de {first:,.0f} el {first_d} a {last:,.0f} el {last_d}."),
+    },
+}
+
+_LABELS = {
+    "en": {"hour": "Hour of Day", "value": "Visible Stores", "timestamp": "Time", "date": "Date", "period": "Period",
+           "first": "First {n} days", "last": "Last {n} days"},
+    "es": {"hour": "Hora del día", "value": "Tiendas visibles", "timestamp": "Tiempo", "date": "Fecha",
+           "period": "Periodo", "first": "Primeros {n} días", "last": "Últimos {n} días"},
+}
+
+
+def _spec(intent: str, lang: str, n_days: int, agg: dict) -> tuple[dict, dict]:
+    """Chart spec and template fields for an intent."""
+    labels = _LABELS[lang]
+    hourly, daily, cells = agg["hourly"], agg["daily"], agg["cells"]
+    axis = lambda *cols: {c: labels[c] for c in cols}
+
+    if intent in ("hourly_avg", "peak_hour"):
+        code = "df.groupby('hour')['value'].mean().reset_index()"
+        if intent == "peak_hour":
+            code += ".sort_values('value', ascending=False).head(10)"
+        spec = {"chart_type": "bar", "data_code": code, "x": "hour", "y": "value", "labels": axis("hour", "value")}
+        fields = {"mean": agg["mean"], "low": hourly.min(), "low_h": hourly.idxmin(),
+                  "high": hourly.max(), "high_h": hourly.idxmax()}
+    elif intent == "daily_avg":
+        spec = {"chart_type": "bar", "data_code": "df.set_index('timestamp').resample('1D')['value'].mean().reset_index()",
+                "x": "timestamp", "y": "value", "labels": axis("timestamp", "value")}
+        fields = {"mean": daily.mean(), "low": daily.min(), "low_d": daily.idxmin(),
+                  "high": daily.max(), "high_d": daily.idxmax()}
+    elif intent == "distribution":
+        spec = {"chart_type": "histogram", "data_code": "df[['value']]", "x": "value", "y": None,
+                "labels": axis("value")}
+        fields = {k: agg[k] for k in ("min", "max", "median", "p05", "p95")}
+    elif intent == "heatmap":
+        spec = {"chart_type": "heatmap", "x": "date", "y": "hour", "z": "value",
+                "data_code": "df.assign(date=df['timestamp'].dt.date.astype(str))"
+                             ".groupby(['date','hour'])['value'].mean().reset_index()",
+                "labels": axis("date", "hour", "value")}
+        (low_d, low_h), (high_d, high_h) = cells.idxmin(), cells.idxmax()
+        fields = {"low": cells.min(), "low_d": low_d, "low_h": low_h,
+                  "high": cells.max(), "high_d": high_d, "high_h": high_h}
+    elif intent == "compare_days":
+        days = agg["days"]
+        first_end, last_start = days[n_days - 1], days[-n_days]
+        first_label, last_label = labels["first"].format(n=n_days), labels["last"].format(n=n_days)
+        spec = {"chart_type": "line", "x": "hour", "y": "value", "color": "period",
+                "data_code": "df.assign(date=df['timestamp'].dt.date.astype(str))"
+                             f".query(\"date <= '{first_end}' or date >= '{last_start}'\")"
+                             f".assign(period=lambda d: d['date'].le('{first_end}')"
+                             f".map({{True: '{first_label}', False: '{last_label}'}}))"
+                             ".groupby(['period','hour'])['value'].mean().reset_index()",
+                "labels": axis("hour", "value", "period")}
+        totals = agg["daily_totals"]
+        head, tail = totals.iloc[:n_days].sum(), totals.iloc[-n_days:].sum()
+        first, last = head["sum"] / head["count"], tail["sum"] / tail["count"]
+        fields = {"n": n_days, "first": first, "last": last, "change": (last / first - 1) * 100 if first else 0.0}
+    else:  # trend
+        spec = {"chart_type": "line", "x": "timestamp", "y": "value", "labels": axis("timestamp", "value"),
+                "data_code": "df.set_index('timestamp').resample('1h')['value'].mean().reset_index()"}
+        fields = {"start": daily.index[0], "end": daily.index[-1], "low": agg["hourly_low"], "high": agg["hourly_high"],
+                  "first": daily.iloc[0], "first_d": daily.index[0], "last": daily.iloc[-1], "last_d": daily.index[-1]}
+    return spec, fields
+
+
+@lru_cache(maxsize=64)
+def intent_answer(intent: str, lang: str, n_days: int = 0) -> tuple[dict, str]:
+    """(chart spec, explanation) for a recognized intent; cached per dataset load."""
+    agg = intent_aggregates()
+    spec, fields = _spec(intent, lang, n_days, agg)
+    title, template = _TEXT[intent][lang]
+    spec["title"] = title.format(n=n_days)
+    return spec, template.format(**fields)
+
+
+register_dataset_cache("intent_aggregates", intent_aggregates)
+register_dataset_cache("intent_answer", intent_answer)
+
+
+# ---------------------------------------------------------------------------
+# Router
+# ---------------------------------------------------------------------------
+
+def refers_back(query: str) -> bool:
+    """Whether the question points back at earlier turns of the conversation."""
+    return _has(_REFERENCES, normalize(query))
+
+
+def can_route(query: str, chat_history: list[dict] | None = None) -> tuple[str, int] | None:
+    """(intent, compare-days count) if ``route_query`` will answer without the LLM.
+
+    With ``chat_history``, follow-ups that refer back to it are not routed.
+    Nothing is routed when ``INTENT_ROUTER_ENABLED`` is off. Callers use this
+    to decide whether a question needs an LLM admission slot.
+    """
+    if not INTENT_ROUTER_ENABLED or (chat_history and refers_back(query)):
+        return None
+    matched = match_intent(query)
+    if matched is not None:
+        intent, n_days = matched
+        if intent == "compare_days" and not 0 < n_days <= len(intent_aggregates()["days"]) // 2:
+            return None
+    return matched
+
+
+def route_query(query: str, chat_history: list[dict] | None = None) -> tuple[str, dict, str] | None:
+    """(intent, chart spec, explanation) if the question has a fast path, else None."""
+    matched = can_route(query, chat_history)
+    if matched is None:
+        ROUTER_QUERIES.inc(outcome="unrouted")
+        _update_ratio()
+        return None
+
+    intent, n_days = matched
+    spec, explanation = intent_answer(intent, detect_language(query), n_days)
+    ROUTER_QUERIES.inc(outcome="routed")
+    ROUTER_INTENTS.inc(intent=intent)
+    _update_ratio()
+    return intent, dict(spec), explanation
+
+
+def _update_ratio() -> None:
+    total = ROUTER_QUERIES.value(outcome="routed") + ROUTER_QUERIES.value(outcome="unrouted")
+    ROUTER_RATIO.set(ROUTER_QUERIES.value(outcome="routed") / total if total else 0.0)
+
+
+def router_stats() -> dict:
+    """Routed vs unrouted chat query counts."""
+    routed = ROUTER_QUERIES.value(outcome="routed")
+    unrouted = ROUTER_QUERIES.value(outcome="unrouted")
+    return {
+        "enabled": INTENT_ROUTER_ENABLED,
+        "routed": int(routed),
+        "unrouted": int(unrouted),
+        "routed_ratio": round(routed / (routed + unrouted), 4) if routed + unrouted else 0.0,
+        "by_intent": {intent: int(ROUTER_INTENTS.value(intent=intent)) for intent in INTENTS},
+    }
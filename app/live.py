@@ -0,0 +1,292 @@
+"""Live push channel: incremental KPIs and bucket updates fanned out over WebSockets.
+
+Each ingested point updates running aggregates once; the resulting message is
+serialized once per subscribed resolution and queued to every subscriber.
+Subscriber queues are bounded and drop their oldest message when full, so a
+stalled client never blocks the broadcast.
+"""
+
+import asyncio
+import bisect
+import json
+import math
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from app.config import LIVE_QUEUE_SIZE, LIVE_REPLAY_SECONDS
+from app.data import ROLLUP_LEVELS, load_dataframe, register_dataset_cache
+
+LIVE_RESOLUTIONS = {name: step for name, step in ROLLUP_LEVELS}
+
+
+# ---------------------------------------------------------------------------
+# Incremental aggregates
+# ---------------------------------------------------------------------------
+
+class RunningKpis:
+    """Running versions of the dashboard KPIs (see app.data.compute_kpis).
+
+    Mean/std use Welford's update. ``uptime_pct`` counts values above a
+    moving threshold (mean - std) exactly, like ``app.data.WindowAggregate``:
+    values are kept sorted as a base array plus a small sorted tail of
+    ingested points, merged into the base once it reaches ``tail_limit``.
+    """
+
+    def __init__(self, tail_limit: int = 4096):
+        self.tail_limit = tail_limit
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.max = None
+        self.current = None
+        self._base = np.empty(0, dtype=np.int64)
+        self._tail: list[int] = []
+
+    def add_many(self, values: np.ndarray) -> None:
+        """Bulk-load values (used to seed from the stored dataset)."""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+        n = values.size
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        delta = batch_mean - self.mean
+        total = self.count + n
+        self.mean += delta * n / total
+        self._m2 += batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        batch_max = int(values.max())
+        self.max = batch_max if self.max is None else max(self.max, batch_max)
+        self.current = int(values[-1])
+        self._base = np.sort(np.concatenate((self._base, values.astype(np.int64), self._tail)))
+        self._tail = []
+
+    def add(self, value: float) -> None:
+        """Add a single value."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.max = int(value) if self.max is None else max(self.max, int(value))
+        self.current = int(value)
+        bisect.insort(self._tail, int(value))
+        if len(self._tail) >= self.tail_limit:
+            self._base = np.sort(np.concatenate((self._base, self._tail)))
+            self._tail = []
+
+    def _above(self, threshold: float) -> int:
+        """Number of values strictly above ``threshold``."""
+        base = self._base.size - int(np.searchsorted(self._base, threshold, side="right"))
+        return base + len(self._tail) - bisect.bisect_right(self._tail, threshold)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def snapshot(self) -> dict:
+        """KPI dict in the same shape as the /api/data/filtered ``kpis``."""
+        if self.count == 0:
+            return {}
+        avg_value = round(self.mean, 2)
+        threshold = max(0, avg_value - round(self.std, 2))
+        above = self._above(threshold)
+        return {
+            "current_stores": self.current,
+            "period_avg": avg_value,
+            "peak_max": self.max,
+            "uptime_pct": round(above / self.count * 100, 1),
+            "threshold": round(threshold, 0),
+            "total_records": self.count,
+        }
+
+
+class BucketAggregator:
+    """Mean/std of the current time bucket at one resolution."""
+
+    def __init__(self, step: pd.Timedelta):
+        self.step = step
+        self.start = None
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, ts: pd.Timestamp, value: float) -> dict:
+        start = ts.floor(self.step) if self.step < pd.Timedelta(days=1) else ts.normalize()
+        if start != self.start:
+            self.start, self.count, self.total, self.total_sq = start, 0, 0.0, 0.0
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        mean = self.total / self.count
+        var = (self.total_sq - self.count * mean * mean) / (self.count - 1) if self.count > 1 else 0.0
+        std = math.sqrt(max(var, 0.0))
+        return {
+            "timestamp": str(self.start),
+            "mean": mean,
+            "std": std,
+            "value": mean,
+            "upper": mean + std,
+            "lower": max(mean - std, 0.0),
+            "count": self.count,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Hub
+# ---------------------------------------------------------------------------
+
+class Subscriber:
+    """A connected client: its resolution and bounded outgoing queue."""
+
+    def __init__(self, resolution: str, queue_size: int = LIVE_QUEUE_SIZE):
+        self.resolution = resolution
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, message: str) -> None:
+        """Enqueue without blocking; drop the oldest message if the client lags."""
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message)
+
+
+class LiveHub:
+    """Computes each update once and fans it out to all subscribers."""
+
+    def __init__(self):
+        self.kpis = RunningKpis()
+        self.subscribers: set[Subscriber] = set()
+        self._buckets = {res: BucketAggregator(step) for res, step in LIVE_RESOLUTIONS.items()}
+        self.last_timestamp: pd.Timestamp | None = None
+        self.published = 0
+        self._replay_task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def seed(self, df: pd.DataFrame) -> None:
+        """Initialize the running KPIs from already stored rows."""
+        self.kpis.add_many(df["value"].to_numpy())
+        if len(df):
+            self.last_timestamp = df["timestamp"].iloc[-1]
+
+    def reseed(self, df: pd.DataFrame) -> None:
+        """Restart the aggregates from a reloaded dataset, keeping the subscribers.
+
+        Connected clients get a fresh snapshot and a running replay restarts on
+        the new data. Those steps run on the hub's event loop, so a reload
+        from another thread is safe.
+        """
+        self.kpis = RunningKpis()
+        self._buckets = {res: BucketAggregator(step) for res, step in LIVE_RESOLUTIONS.items()}
+        self.last_timestamp = None
+        self.seed(df)
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._restart()
+        else:
+            self._loop.call_soon_threadsafe(self._restart)
+
+    def _restart(self) -> None:
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            self._replay_task = None
+        if not self.subscribers:
+            return
+        snapshot = json.dumps({"type": "snapshot", "kpis": self.kpis.snapshot()})
+        for sub in list(self.subscribers):
+            sub.offer(snapshot)
+        self._ensure_replay()
+
+    def subscribe(self, resolution: str) -> Subscriber:
+        if resolution not in LIVE_RESOLUTIONS:
+            raise ValueError(f"Unsupported resolution: {resolution!r}")
+        sub = Subscriber(resolution)
+        self._loop = asyncio.get_running_loop()
+        self.subscribers.add(sub)
+        sub.offer(json.dumps({"type": "snapshot", "kpis": self.kpis.snapshot()}))
+        self._ensure_replay()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+
+    def publish(self, ts: pd.Timestamp, value: float) -> int:
+        """Ingest one point and broadcast it. Returns the number of deliveries."""
+        self.kpis.add(value)
+        self.last_timestamp = ts
+        self.published += 1
+        kpis = self.kpis.snapshot()
+
+        buckets = {res: agg.add(ts, value) for res, agg in self._buckets.items()}
+
+        # One serialized message per resolution that has subscribers
+        messages: dict[str, str] = {}
+        for res in {sub.resolution for sub in self.subscribers}:
+            messages[res] = json.dumps({
+                "type": "update",
+                "resolution": res,
+                "point": {"timestamp": str(ts), "value": int(value)},
+                "bucket": buckets[res],
+                "kpis": kpis,
+            })
+
+        for sub in list(self.subscribers):
+            sub.offer(messages[sub.resolution])
+        return len(self.subscribers)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "dropped": sum(sub.dropped for sub in self.subscribers),
+        }
+
+    # -- optional replay source -------------------------------------------
+
+    def _ensure_replay(self) -> None:
+        if LIVE_REPLAY_SECONDS <= 0 or self._replay_task is not None:
+            return
+        self._replay_task = asyncio.get_running_loop().create_task(self._replay())
+
+    async def _replay(self) -> None:
+        """Replay stored values after the last timestamp (demo / load tests)."""
+        values = load_dataframe()["value"].to_numpy()
+        i = 0
+        while True:
+            await asyncio.sleep(LIVE_REPLAY_SECONDS)
+            ts = self.last_timestamp + pd.Timedelta(seconds=10)
+            self.publish(ts, float(values[i % len(values)]))
+            i += 1
+
+
+async def pump(websocket, sub: Subscriber) -> None:
+    """Forward a subscriber's queue to its WebSocket until the client goes away."""
+    while True:
+        message = await sub.queue.get()
+        await websocket.send_text(message)
+
+
+_hub = LiveHub()
+
+
+@lru_cache(maxsize=1)
+def get_live_hub() -> LiveHub:
+    """The process-wide hub, reseeded from the stored dataset after each reload (cached).
+
+    The hub object itself outlives reloads so connected sockets keep receiving.
+    """
+    _hub.reseed(load_dataframe())
+    return _hub
+
+
+register_dataset_cache("live_hub", get_live_hub)
@@ -1,22 +1,54 @@
 """FastAPI application — RappiMakers AI Dashboard Backend."""
 
-from fastapi import FastAPI, HTTPException, Query
+import time
+
+# Taken before the imports below so readiness reports the app's import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 import pandas as pd
 
+from app.admission import Overloaded, admission
 from app.agent import run_agent_query
-from app.data import get_data_summary, get_summary_text, load_dataframe
-from app.config import API_HOST, API_PORT
+from app.batch import run_batch
+from app.data import filtered_payload, get_data_summary, get_summary_text, load_dataframe, normalize_filters
+from app.export import EXPORT_FORMATS, export_stream
+from app.incidents import get_incident_detector, incident_stats
+from app.intents import can_route, router_stats
+from app.metrics import MetricsMiddleware, render as render_metrics
+from app.profiling import ProfilingMiddleware, is_authorized, profile_store
+from app.live import LIVE_RESOLUTIONS, get_live_hub, pump
+from app.singleflight import history_key, normalize_query, single_flight
+from app.warmup import readiness, warm_up
+from app.config import API_HOST, API_PORT, BATCH_CONCURRENCY, BATCH_MAX_QUERIES, DEFAULT_MAX_POINTS
 
 # ---------------------------------------------------------------------------
 # FastAPI app
 # ---------------------------------------------------------------------------
 
+readiness.imported(_IMPORT_STARTED)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up in the background; ``/ready`` reports when it is done."""
+    task = asyncio.create_task(asyncio.to_thread(warm_up, readiness))
+    yield
+    task.cancel()
+
+
 app = FastAPI(
     title="RappiMakers AI Dashboard API",
     description="AI-powered API for querying and visualizing Rappi store availability data.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -25,7 +57,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+DATA_GUARD = lambda: admission.slot("data")  # noqa: E731
+CHAT_GUARD = lambda: admission.slot("chat")  # noqa: E731
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load quickly instead of letting clients wait for their timeout."""
+    return JSONResponse(
+        {"detail": exc.detail}, status_code=exc.status_code, headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -38,6 +84,13 @@ class QueryRequest(BaseModel):
     chat_history: list[dict] | None = None
 
 
+class BatchQueryRequest(BaseModel):
+    """Batch of independent queries."""
+    queries: list[str]
+    concurrency: int | None = None
+    stream: bool = False
+
+
 class QueryResponse(BaseModel):
     """Agent response with optional chart."""
     explanation: str
@@ -45,6 +98,17 @@ class QueryResponse(BaseModel):
     error: str | None = None
 
 
+class LivePoint(BaseModel):
+    """A single ingested measurement."""
+    timestamp: str
+    value: int = Field(ge=0)  # a store count; negatives would corrupt the KPI histogram
+
+
+class IngestRequest(BaseModel):
+    """Batch of measurements to push to live subscribers."""
+    points: list[LivePoint]
+
+
 class DataSummaryResponse(BaseModel):
     """Dataset summary metadata."""
     total_rows: int
@@ -66,11 +130,20 @@ async def root():
     return {"status": "ok", "service": "RappiMakers AI Dashboard API"}
 
 
+@app.get("/ready", tags=["Health"])
+async def ready():
+    """Readiness probe: 200 once the startup warm-up has finished, 503 before (or if it failed)."""
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if readiness.ready else 503)
+
+
 @app.get("/api/data/summary", response_model=DataSummaryResponse, tags=["Data"])
 async def data_summary():
     """Return a structured summary of the availability dataset."""
     try:
-        return get_data_summary()
+        return await single_flight.do("get_data_summary", None, get_data_summary, guard=DATA_GUARD)
+    except Overloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -94,19 +167,13 @@ async def query_agent(request: QueryRequest):
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
 
-    # Convert chat_history dicts to LangChain message format
-    chat_history = []
-    if request.chat_history:
-        from langchain_core.messages import HumanMessage, AIMessage
-        for msg in request.chat_history:
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if role == "user":
-                chat_history.append(HumanMessage(content=content))
-            else:
-                chat_history.append(AIMessage(content=content))
-
-    result = run_agent_query(request.query, chat_history=chat_history)
+    # Identical concurrent questions (same text and history) share one LLM call;
+    # only LLM-bound questions take a chat admission slot
+    key = (normalize_query(request.query), history_key(request.chat_history))
+    result = await single_flight.do(
+        "run_agent_query", key, run_agent_query, request.query, chat_history=request.chat_history,
+        guard=None if can_route(request.query, request.chat_history) else CHAT_GUARD,
+    )
 
     if result["error"]:
         raise HTTPException(status_code=500, detail=result["error"])
@@ -118,6 +185,48 @@ async def query_agent(request: QueryRequest):
     )
 
 
+@app.post("/api/query/batch", tags=["Agent"])
+async def query_batch(request: BatchQueryRequest):
+    """Run several queries concurrently (e.g. to prefetch report charts).
+
+    At most ``concurrency`` queries (capped at BATCH_CONCURRENCY) run at once,
+    sharing one dataset snapshot and LLM client. Per-item failures are
+    reported in that item's ``error`` and do not fail the batch. With
+    ``stream: true`` results are sent as NDJSON lines in completion order,
+    followed by a ``{"done": true, ...}`` line; otherwise they are collected
+    and returned in request order.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries cannot be empty.")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch.")
+    if request.concurrency is not None and request.concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be >= 1.")
+    concurrency = min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+
+    def totals(results: list[dict], started: float) -> dict:
+        return {
+            "count": len(results),
+            "errors": sum(1 for r in results if r["error"]),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    started = time.perf_counter()
+    if request.stream:
+        async def lines():
+            results = []
+            async for item in run_batch(request.queries, concurrency):
+                results.append(item)
+                yield json.dumps(item) + "\n"
+            yield json.dumps({"done": True, **totals(results, started)}) + "\n"
+
+        return StreamingResponse(lines(), media_type=EXPORT_FORMATS["ndjson"])
+
+    results = [item async for item in run_batch(request.queries, concurrency)]
+    results.sort(key=lambda r: r["index"])
+    return {"results": results, **totals(results, started)}
+
+
 @app.get("/api/data/preview", tags=["Data"])
 async def data_preview(rows: int = 20):
     """Return a preview of the first N rows of the dataset."""
@@ -129,89 +238,176 @@ async def data_preview(rows: int = 20):
     return {"data": preview.to_dict(orient="records"), "total_rows": len(df)}
 
 
+@app.get("/api/data/export", tags=["Data"])
+async def data_export(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|arrow)$"),
+    date_start: str | None = None,
+    date_end: str | None = None,
+    columns: str | None = None,
+    batch_size: int = Query(10_000, ge=1, le=100_000),
+):
+    """Stream raw rows as NDJSON, CSV or Arrow IPC.
+
+    Query params:
+    - format: 'ndjson' (default), 'csv' or 'arrow'
+    - date_start/date_end: ISO date strings (e.g. '2026-02-01')
+    - columns: comma-separated column projection (default: all columns)
+    - batch_size: rows encoded per chunk
+    """
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        stream = export_stream(format, date_start, date_end, selected, batch_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    ext = "arrows" if format == "arrow" else format
+    return StreamingResponse(
+        stream,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="availability.{ext}"'},
+    )
+
+
 @app.get("/api/data/filtered", tags=["Data"])
 async def data_filtered(
     date_start: str | None = None,
     date_end: str | None = None,
     hour_start: int | None = None,
     hour_end: int | None = None,
-    resample: str = "10min",
+    resample: str | None = None,
+    max_points: int = Query(DEFAULT_MAX_POINTS, ge=10, le=20_000),
+    since: str | None = None,
 ):
     """Return filtered + resampled data for the dashboard charts.
 
     Query params:
     - date_start/date_end: ISO date strings (e.g. '2026-02-01')
     - hour_start/hour_end: integers 0-23
-    - resample: pandas resample frequency (default '10min')
+    - resample: optional minimum resample frequency (e.g. '5min'); coarsened
+      automatically if the range would exceed max_points
+    - max_points: time-series point budget; the resolution is chosen from
+      the DATA_REFERENCE.md §10 rollup levels to fit it
+    - since: cursor from a previous response; only buckets, heatmap cells and
+      hourly averages touched since then are returned (``delta: true``)
     """
-    df = load_dataframe().copy()
-
-    # Apply date filter
-    if date_start:
-        df = df[df["timestamp"] >= pd.Timestamp(date_start, tz=df["timestamp"].dt.tz)]
-    if date_end:
-        end_ts = pd.Timestamp(date_end, tz=df["timestamp"].dt.tz) + pd.Timedelta(days=1)
-        df = df[df["timestamp"] < end_ts]
-
-    # Apply hour filter
-    if hour_start is not None:
-        df = df[df["hour"] >= hour_start]
-    if hour_end is not None:
-        df = df[df["hour"] <= hour_end]
-
-    if len(df) == 0:
-        return {"time_series": [], "kpis": {}, "heatmap": [], "hourly_avg": []}
-
-    # --- KPIs ---
-    current_value = int(df.iloc[-1]["value"])
-    avg_value = round(float(df["value"].mean()), 2)
-    max_value = int(df["value"].max())
-    std_value = round(float(df["value"].std()), 2)
-    # Uptime: % of time value > threshold (mean - 1 std as proxy)
-    threshold = max(0, avg_value - std_value)
-    uptime_pct = round(float((df["value"] > threshold).mean() * 100), 1)
-
-    kpis = {
-        "current_stores": current_value,
-        "period_avg": avg_value,
-        "peak_max": max_value,
-        "uptime_pct": uptime_pct,
-        "threshold": round(threshold, 0),
-        "total_records": len(df),
-    }
+    try:
+        # Equivalent spellings of the same filters share one computation and cursor
+        filters = normalize_filters(date_start, date_end, hour_start, hour_end, resample)
+        key = (*filters.values(), max_points, since)
+        return await single_flight.do(
+            "data_filtered", key, filtered_payload,
+            **filters, max_points=max_points, since=since, guard=DATA_GUARD,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/incidents", tags=["Data"])
+async def incidents(
+    date_start: str | None = None,
+    date_end: str | None = None,
+    kind: str | None = Query(None, pattern="^(drop|gap)$"),
+    min_duration: int = 0,
+):
+    """Return detected outage incidents and MTTR/MTBF aggregates.
 
-    # --- Time series (resampled) ---
-    ts = df.set_index("timestamp")["value"].resample(resample).agg(["mean", "std"]).reset_index()
-    ts.columns = ["timestamp", "mean", "std"]
-    ts = ts.fillna(0)  # replace all NaN with 0
-    # 5-min moving average
-    ts["ma_5min"] = ts["mean"].rolling(window=max(1, 5 // max(1, int(resample.replace("min", "").replace("h", "60").replace("D", "1440")) if resample[-1] != 's' else 1)), min_periods=1).mean()
-    ts["upper"] = ts["mean"] + ts["std"]
-    ts["lower"] = (ts["mean"] - ts["std"]).clip(lower=0)
-    ts["value"] = ts["mean"]  # frontend expects 'value' field
-    # Ensure no NaN/Inf in output
-    ts = ts.fillna(0).replace([float('inf'), float('-inf')], 0)
-    ts["timestamp"] = ts["timestamp"].astype(str)
-    time_series = ts.to_dict(orient="records")
-
-    # --- Heatmap: Day x Hour ---
-    df["date"] = df["timestamp"].dt.date.astype(str)
-    heatmap_df = df.groupby(["date", "hour"])["value"].mean().reset_index()
-    heatmap_df.rename(columns={"date": "day"}, inplace=True)
-    heatmap_df["value"] = heatmap_df["value"].round(0).astype(int)
-    heatmap = heatmap_df.to_dict(orient="records")
-
-    # --- Hourly average bar chart ---
-    hourly_avg_df = df.groupby("hour")["value"].mean().reset_index()
-    hourly_avg_df.rename(columns={"value": "avg_value"}, inplace=True)
-    hourly_avg_df["avg_value"] = hourly_avg_df["avg_value"].round(0).astype(int)
-    hourly_avg = hourly_avg_df.to_dict(orient="records")
+    Query params:
+    - date_start/date_end: ISO date strings (e.g. '2026-02-01')
+    - kind: 'drop' (below the time-of-day baseline) or 'gap' (missing samples)
+    - min_duration: minimum incident duration in seconds
+    """
+    detector = get_incident_detector()
+    try:
+        start = pd.Timestamp(date_start, tz=detector.tz) if date_start else None
+        end = (
+            pd.Timestamp(date_end, tz=detector.tz) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+            if date_end else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items = detector.query(start, end, kind=kind, min_duration_s=min_duration)
+    return {"incidents": items, "stats": incident_stats(items)}
+
+
+@app.post("/api/live/ingest", tags=["Live"])
+async def live_ingest(request: IngestRequest):
+    """Ingest new measurements and broadcast them to /ws/live subscribers."""
+    hub = get_live_hub()
+    tz = load_dataframe()["timestamp"].dt.tz
+    points = []
+    for p in request.points:
+        try:
+            ts = pd.Timestamp(p.timestamp)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Naive timestamps are local time, like the stored dataset
+        points.append((ts.tz_localize(tz) if ts.tzinfo is None else ts, p.value))
+    for ts, value in sorted(points, key=lambda p: p[0]):
+        hub.publish(ts, value)
+    return {"ingested": len(points), **hub.stats()}
+
+
+@app.websocket("/ws/live")
+async def live_updates(websocket: WebSocket, resolution: str = "10s"):
+    """Push each ingested point, its bucket at ``resolution`` and the updated KPIs.
 
+    Query params:
+    - resolution: one of the DATA_REFERENCE.md §10 rollup levels (default '10s')
+    """
+    if resolution not in LIVE_RESOLUTIONS:
+        await websocket.close(code=1008, reason=f"Unsupported resolution: {resolution}")
+        return
+    await websocket.accept()
+    hub = get_live_hub()
+    sub = hub.subscribe(resolution)
+    sender = asyncio.create_task(pump(websocket, sub))
+    try:
+        # Incoming messages are ignored; receiving only detects disconnects
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(sub)
+        sender.cancel()
+        # Retrieve the sender's outcome (e.g. a send to the closed socket failed)
+        await asyncio.gather(sender, return_exceptions=True)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+async def metrics():
+    """Prometheus-format latency, token, payload and cache metrics."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profiles", tags=["Debug"])
+async def list_profiles(x_profile: str | None = Header(None)):
+    """List stored request profiles (requires the X-Profile token)."""
+    if not is_authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling token required.")
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/debug/profiles/{profile_id}", tags=["Debug"])
+async def get_profile(profile_id: str, x_profile: str | None = Header(None)):
+    """Return one stored profile with its call tree and stage timings."""
+    if not is_authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling token required.")
+    record = profile_store.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return record
+
+
+@app.get("/api/stats", tags=["Health"])
+async def stats():
+    """Return in-process counters (single-flight, live channel, intent router, admission, startup)."""
     return {
-        "time_series": time_series,
-        "kpis": kpis,
-        "heatmap": heatmap,
-        "hourly_avg": hourly_avg,
+        "single_flight": single_flight.stats(),
+        "live": get_live_hub().stats(),
+        "intent_router": router_stats(),
+        "admission": admission.stats(),
+        "startup": readiness.status(),
     }
 
 
@@ -0,0 +1,268 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Provides counters, gauges and histograms, a ``stage`` context manager that
+records per-stage latency (and feeds the ``Server-Timing`` header of the
+current request), and an ASGI middleware that times every HTTP request.
+This module has no dependencies on the rest of the app so any module can
+import it.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16_384, 32_768)
+SIZE_BUCKETS = (256, 1024, 4096, 16_384, 65_536, 262_144, 1_048_576, 4_194_304, 16_777_216)
+
+_REGISTRY: list["_Metric"] = []
+_CACHES: dict[str, Callable] = {}
+
+# Per-request list of (stage, seconds), set by MetricsMiddleware
+_timings: ContextVar[list | None] = ContextVar("server_timings", default=None)
+
+# Callables invoked with the stage name on entering a stage (used by profiling)
+stage_listeners: list[Callable[[str], None]] = []
+
+
+# ---------------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------------
+
+def _fmt_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # key -> [count per bucket..., +Inf count, sum]
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[len(self.buckets)] += 1
+            row[-1] += value
+
+    def count(self, **labels) -> int:
+        row = self._values.get(self._key(labels))
+        return int(row[len(self.buckets)]) if row else 0
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for key, row in items:
+            for bound, n in zip(self.buckets, row):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {n}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, inf)} {row[len(self.buckets)]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {row[-1]}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {row[len(self.buckets)]}")
+        return lines
+
+
+# ---------------------------------------------------------------------------
+# Application metrics
+# ---------------------------------------------------------------------------
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"),
+)
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "HTTP response body size by route.", ("route",), buckets=SIZE_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Latency of internal processing stages.", ("stage",),
+)
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used.", ("kind",))
+PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Counted prompt tokens per LLM request by part.", ("part",), buckets=TOKEN_BUCKETS,
+)
+HISTORY_COMPACTED = Counter(
+    "chat_history_compacted_messages_total", "Chat history messages folded into the summary.",
+)
+LLM_CALLS = Counter("llm_calls_total", "LLM calls by outcome.", ("outcome",))
+CHART_BYTES = Histogram(
+    "chart_json_size_bytes", "Size of generated Plotly chart JSON.", buckets=SIZE_BUCKETS,
+)
+CHART_ERRORS = Counter("chart_errors_total", "Chart build failures by step.", ("step",))
+DATASET_LOAD_SECONDS = Gauge("dataset_load_seconds", "Time taken by the last dataset load.")
+STARTUP_SECONDS = Gauge("startup_seconds", "Startup time by phase (import, warm-up steps, ready).", ("phase",))
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "Single-flight calls, executed or coalesced.", ("name", "outcome"),
+)
+ROUTER_QUERIES = Counter(
+    "intent_router_queries_total", "Chat queries answered by the fast path (routed) or the LLM (unrouted).", ("outcome",),
+)
+ROUTER_INTENTS = Counter("intent_router_intents_total", "Fast-path answers by intent.", ("intent",))
+ROUTER_RATIO = Gauge("intent_router_routed_ratio", "Share of chat queries answered without the LLM.")
+ADMISSION_DECISIONS = Counter(
+    "admission_decisions_total", "Admission outcomes (admitted, queued, shed, timeout) by lane.", ("lane", "outcome"),
+)
+ADMISSION_INFLIGHT = Gauge("admission_inflight", "Admitted requests currently running by lane.", ("lane",))
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for admission by lane.", ("lane",))
+ADMISSION_WAIT = Histogram("admission_wait_seconds", "Time spent waiting for admission by lane.", ("lane",))
+CACHE_HITS = Gauge("cache_hits", "lru_cache hits by cache.", ("cache",))
+CACHE_MISSES = Gauge("cache_misses", "lru_cache misses by cache.", ("cache",))
+
+
+def register_cache(name: str, fn: Callable) -> None:
+    """Expose an ``lru_cache``-wrapped function's hit/miss counts."""
+    _CACHES[name] = fn
+
+
+def render() -> str:
+    """Prometheus text exposition of every registered metric."""
+    for name, fn in _CACHES.items():
+        info = fn.cache_info()
+        CACHE_HITS.set(info.hits, cache=name)
+        CACHE_MISSES.set(info.misses, cache=name)
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Stage timing
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def stage(name: str):
+    """Time a block as ``name``; also reported in the request's Server-Timing."""
+    for listener in stage_listeners:
+        listener(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def current_timings() -> list[tuple[str, float]]:
+    """Stage timings recorded so far for the current request."""
+    return list(_timings.get() or [])
+
+
+def server_timing_header(timings: list[tuple[str, float]], total: float) -> str:
+    """Format stage timings (summed per stage) as a Server-Timing value in ms."""
+    merged: dict[str, float] = {}
+    for name, seconds in timings:
+        merged[name] = merged.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in merged.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency/size and adding Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: list[tuple[str, float]] = []
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header.encode())]}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - start, method=scope["method"], route=route_path, status=status)
+            HTTP_RESPONSE_BYTES.observe(size, route=route_path)
@@ -0,0 +1,232 @@
+"""Opt-in per-request sampling profiler with an on-disk ring buffer.
+
+A request carrying ``X-Profile: <PROFILE_TOKEN>`` (or ``?profile=<token>``)
+is run under a sampler thread that reads ``sys._current_frames()`` every
+``PROFILE_INTERVAL_MS``. Only threads working for that request are sampled:
+the event-loop thread handling it, plus any thread that enters a
+``metrics.stage`` while the request's profile is active. The call tree and
+stage timings are written as JSON to ``PROFILE_DIR``, keeping the newest
+``PROFILE_MAX_FILES``. Requests without the flag only pay for one header
+lookup here and one context-variable read per stage.
+"""
+
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode
+
+from app.config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES, PROFILE_TOKEN
+from app.metrics import current_timings, stage_listeners
+
+_active: ContextVar["Profile | None"] = ContextVar("active_profile", default=None)
+_THIS_FILE = os.path.abspath(__file__)
+
+
+# ---------------------------------------------------------------------------
+# Sampler
+# ---------------------------------------------------------------------------
+
+class Profile:
+    """Collects stack samples for a fixed set of threads."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.id = uuid.uuid4().hex[:12]
+        self.interval = interval
+        self.threads: set[int] = set()
+        self.stacks: dict[tuple, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+
+    def add_thread(self, ident: int) -> None:
+        self.threads.add(ident)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in tuple(self.threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = _walk(frame)
+                if stack:
+                    self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                    self.samples += 1
+
+    def call_tree(self) -> dict:
+        """Merge sampled stacks (root first) into a nested count tree."""
+        root = {"name": "<root>", "count": self.samples, "children": {}}
+        for stack, count in self.stacks.items():
+            node = root
+            for frame in stack:
+                child = node["children"].get(frame)
+                if child is None:
+                    child = node["children"][frame] = {"name": frame, "count": 0, "children": {}}
+                child["count"] += count
+                node = child
+        return _finalize(root)
+
+
+def _walk(frame) -> tuple:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename != _THIS_FILE:
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+def _finalize(node: dict) -> dict:
+    children = sorted(node["children"].values(), key=lambda c: c["count"], reverse=True)
+    return {"name": node["name"], "count": node["count"], "children": [_finalize(c) for c in children]}
+
+
+def _on_stage(_name: str) -> None:
+    profile = _active.get()
+    if profile is not None:
+        profile.add_thread(threading.get_ident())
+
+
+stage_listeners.append(_on_stage)
+
+
+# ---------------------------------------------------------------------------
+# Ring buffer storage
+# ---------------------------------------------------------------------------
+
+class ProfileStore:
+    """Bounded directory of profile JSON files; the oldest are evicted first."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _files(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("*.json"))
+
+    def save(self, record: dict) -> None:
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            name = f"{time.time_ns()}-{record['id']}.json"
+            tmp = self.directory / (name + ".tmp")
+            tmp.write_text(json.dumps(record))
+            tmp.replace(self.directory / name)
+            files = self._files()
+            for old in files[: max(0, len(files) - self.max_files)]:
+                old.unlink(missing_ok=True)
+
+    def list(self) -> list[dict]:
+        """Metadata (no call tree) for stored profiles, newest first."""
+        items = []
+        for path in reversed(self._files()):
+            try:
+                record = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            record.pop("call_tree", None)
+            items.append(record)
+        return items
+
+    def get(self, profile_id: str) -> dict | None:
+        for path in self._files():
+            if path.stem.endswith(f"-{profile_id}"):
+                return json.loads(path.read_text())
+        return None
+
+
+profile_store = ProfileStore()
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+def is_authorized(token: str | None) -> bool:
+    """Profiling is disabled unless PROFILE_TOKEN is configured and matches."""
+    if not PROFILE_TOKEN or token is None:
+        return False
+    # Constant-time comparison (bytes: compare_digest rejects non-ASCII str)
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def _requested_token(scope) -> str | None:
+    for key, value in scope.get("headers", []):
+        if key == b"x-profile":
+            return value.decode()
+    if b"profile=" in scope.get("query_string", b""):
+        values = parse_qs(scope["query_string"].decode()).get("profile")
+        return values[0] if values else None
+    return None
+
+
+def _strip_token(query: str) -> str:
+    params = parse_qs(query, keep_blank_values=True)
+    params.pop("profile", None)
+    return urlencode(params, doseq=True)
+
+
+class ProfilingMiddleware:
+    """Runs flagged HTTP requests under the sampler and stores the result."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_authorized(_requested_token(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile()
+        profile.add_thread(threading.get_ident())
+        token = _active.set(profile)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        started = time.time()
+        start = time.perf_counter()
+        profile.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.stop()
+            _active.reset(token)
+            stages: dict[str, float] = {}
+            for name, seconds in current_timings():
+                stages[name] = stages.get(name, 0.0) + seconds * 1000
+            profile_store.save({
+                "id": profile.id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": _strip_token(scope.get("query_string", b"").decode()),
+                "status": status,
+                "started_at": started,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "interval_ms": round(profile.interval * 1000, 2),
+                "samples": profile.samples,
+                "stages_ms": {k: round(v, 1) for k, v in stages.items()},
+                "call_tree": profile.call_tree(),
+            })
@@ -0,0 +1,119 @@
+"""Token-budgeted chat history for the agent prompt.
+
+Clients send the whole conversation on every query. ``compact_history``
+keeps the newest turns that fit ``HISTORY_TOKEN_BUDGET`` and folds the older
+ones into a short summary of what the user asked, so prompt size stays
+bounded however long the conversation runs. Chart JSON is never forwarded:
+only message text is kept, and assistant messages that carry a raw agent
+response or a Plotly figure are reduced to their explanation.
+"""
+
+import json
+from functools import lru_cache
+
+from app.config import HISTORY_SUMMARY_TOKENS, HISTORY_TOKEN_BUDGET, LLM_MODEL
+
+CHART_PLACEHOLDER = "[chart omitted]"
+_QUESTION_CHARS = 120
+
+
+# ---------------------------------------------------------------------------
+# Token counting
+# ---------------------------------------------------------------------------
+
+@lru_cache(maxsize=1)
+def _encoder():
+    """tiktoken encoder for LLM_MODEL, or None if unavailable (e.g. offline)."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(LLM_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of ``text`` (about 4 characters per token without tiktoken)."""
+    if not text:
+        return 0
+    encoder = _encoder()
+    if encoder is None:
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+# ---------------------------------------------------------------------------
+# History compaction
+# ---------------------------------------------------------------------------
+
+def clean_content(content) -> str:
+    """Message text without chart JSON."""
+    text = str(content or "").strip()
+    if text.startswith("{"):
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            return text
+        if isinstance(parsed, dict):
+            if "explanation" in parsed:
+                return str(parsed["explanation"] or "").strip()
+            if "data" in parsed and "layout" in parsed:
+                return CHART_PLACEHOLDER
+    return text
+
+
+def summarize_turns(turns: list[dict], max_tokens: int = HISTORY_SUMMARY_TOKENS) -> str:
+    """Short summary of dropped turns: the user's questions, newest kept first."""
+    questions = [t["content"] for t in turns if t["role"] == "user"]
+    header = "Summary of earlier conversation. The user previously asked:"
+    lines: list[str] = []
+    used = count_tokens(header)
+    for question in reversed(questions):
+        if len(question) > _QUESTION_CHARS:
+            question = question[:_QUESTION_CHARS].rstrip() + "…"
+        line = f"- {question}"
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    omitted = len(questions) - len(lines)
+    lines.reverse()
+    if omitted:
+        lines.insert(0, f"- ({omitted} earlier question{'s' if omitted != 1 else ''} omitted)")
+    if not questions:
+        lines.append(f"- ({len(turns)} earlier message{'s' if len(turns) != 1 else ''} omitted)")
+    return "\n".join([header, *lines])
+
+
+def compact_history(
+    chat_history: list[dict] | None,
+    budget: int = HISTORY_TOKEN_BUDGET,
+) -> tuple[str | None, list[dict]]:
+    """(summary of older turns or None, newest turns fitting ``budget`` tokens).
+
+    Messages are ``{"role": "user" | "assistant", "content": str}``; other keys
+    (e.g. a client-side ``chart``) are dropped.
+    """
+    turns = []
+    for message in chat_history or []:
+        role = "user" if message.get("role", "user") == "user" else "assistant"
+        content = clean_content(message.get("content"))
+        if content:
+            turns.append({"role": role, "content": content})
+
+    kept: list[dict] = []
+    used = 0
+    for turn in reversed(turns):
+        cost = count_tokens(turn["content"])
+        if used + cost > budget:
+            break
+        kept.append(turn)
+        used += cost
+    kept.reverse()
+
+    dropped = turns[: len(turns) - len(kept)]
+    return (summarize_turns(dropped) if dropped else None), kept
@@ -0,0 +1,253 @@
+"""Shared dataset mode: one memory-mapped Arrow file for all uvicorn workers.
+
+When ``SHARED_DATASET_DIR`` is set, the cleaned dataset is written once as an
+uncompressed Arrow IPC file, ``dataset-<version>.arrow``. Its schema metadata
+carries the precomputed aggregates (dataset summary, intent-router
+aggregates, incident baseline), which workers read instead of rebuilding. A
+``CURRENT`` file names the active version. Each worker memory-maps the active
+file read-only and builds its DataFrame as a zero-copy view of the mapping
+(every column, including the tz-aware timestamps). The OS page cache holds a
+single copy, so N workers cost about one dataset of physical memory.
+
+The version is a fingerprint of the source parquet (path, size, mtime).
+Publishing happens under an exclusive file lock: the first worker to start
+(or ``python -m app.shared publish``) writes the file, and the others wait
+and map it. A watcher thread in every worker polls ``CURRENT`` and the
+source file every ``SHARED_POLL_SECONDS``. When the source changes, the
+watcher republishes. When ``CURRENT`` moves to a new version, the worker
+drops its dataset caches and remaps, so all workers switch versions
+together.
+
+The mapped frame is read-only: in-place writes to its columns raise.
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+from app import data
+from app.config import SHARED_POLL_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX: single writer assumed
+    fcntl = None
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+METADATA_KEY = b"rappi_dataset"
+FORMAT_VERSION = 2
+KEEP_VERSIONS = 2
+
+_state_lock = threading.Lock()
+_aggregates: dict[str, dict] = {}
+_mapped_version: str | None = None
+_watcher: threading.Thread | None = None
+
+
+# ---------------------------------------------------------------------------
+# Publishing
+# ---------------------------------------------------------------------------
+
+def _directory() -> Path:
+    return Path(data.SHARED_DATASET_DIR)
+
+
+def source_version(path: str | None = None) -> str:
+    """Fingerprint of the source parquet file (changes when it is replaced)."""
+    path = path or data.PARQUET_PATH
+    st = os.stat(path)
+    raw = f"{FORMAT_VERSION}|{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def dataset_file(version: str, directory: Path | None = None) -> Path:
+    return (directory or _directory()) / f"dataset-{version}.arrow"
+
+
+def current_version(directory: Path | None = None) -> str | None:
+    """Version named by CURRENT, if it exists and its file is present."""
+    directory = directory or _directory()
+    try:
+        version = (directory / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return None
+    return version if version and dataset_file(version, directory).exists() else None
+
+
+@contextmanager
+def _publish_lock(directory: Path):
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / LOCK_FILE, "w") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def compute_aggregates(df: pd.DataFrame) -> dict:
+    """Dataset-derived aggregates every worker would otherwise rebuild (JSON-serializable)."""
+    from app.incidents import build_baseline
+    from app.intents import compute_intent_aggregates
+
+    return {
+        "summary": data.get_data_summary(df),
+        "intents": compute_intent_aggregates(df),
+        "incident_baseline": build_baseline(df).tolist(),
+    }
+
+
+def publish(force: bool = False, directory: Path | None = None) -> str:
+    """Write the current source as the active version (no-op if already active)."""
+    directory = directory or _directory()
+    version = source_version()
+    with _publish_lock(directory):
+        if not force and current_version(directory) == version:
+            return version
+        df = data.read_clean_dataframe()
+        meta = {
+            "version": version,
+            "format": FORMAT_VERSION,
+            "source": os.path.abspath(data.PARQUET_PATH),
+            "created_at": time.time(),
+            "aggregates": compute_aggregates(df),
+        }
+        table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+        table = table.replace_schema_metadata({**table.schema.metadata, METADATA_KEY: json.dumps(meta).encode()})
+
+        target = dataset_file(version, directory)
+        tmp = target.with_suffix(".tmp")
+        with pa.OSFile(str(tmp), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, target)
+        current_tmp = directory / (CURRENT_FILE + ".tmp")
+        current_tmp.write_text(version)
+        os.replace(current_tmp, directory / CURRENT_FILE)
+        _prune(directory, keep=version)
+    return version
+
+
+def _prune(directory: Path, keep: str) -> None:
+    """Delete all but the newest KEEP_VERSIONS files (mapped files stay valid after unlink)."""
+    files = sorted(directory.glob("dataset-*.arrow"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in files[KEEP_VERSIONS:]:
+        if path.name != dataset_file(keep, directory).name:
+            path.unlink(missing_ok=True)
+
+
+# ---------------------------------------------------------------------------
+# Mapping
+# ---------------------------------------------------------------------------
+
+def _timestamps(table: pa.Table) -> pd.Series:
+    """Zero-copy tz-aware ``timestamp`` column.
+
+    ``Table.to_pandas`` copies tz-aware timestamps into a new array; viewing
+    the mapped epoch values with the column's dtype does not.
+    """
+    column = table.column("timestamp")
+    chunk = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    unit, tz = chunk.type.unit, chunk.type.tz
+    epoch = chunk.view(pa.int64()).to_numpy(zero_copy_only=True).view(f"M8[{unit}]")
+    values = pd.DatetimeIndex(epoch, copy=False).array.view(pd.DatetimeTZDtype(unit, tz))
+    return pd.Series(values, name="timestamp", copy=False)
+
+
+def map_dataset() -> pd.DataFrame:
+    """Memory-map the active version as a zero-copy DataFrame, publishing if needed."""
+    global _mapped_version
+    directory = _directory()
+    version = current_version(directory)
+    if version is None or version != source_version():
+        version = publish(directory=directory)
+
+    source = pa.memory_map(str(dataset_file(version, directory)), "r")
+    table = pa.ipc.open_file(source).read_all()
+    aggregates = json.loads(table.schema.metadata[METADATA_KEY])["aggregates"]
+    summary = aggregates["summary"]
+    # JSON object keys are strings; the summary keys hours by int
+    summary["hourly_averages"] = {int(h): v for h, v in summary["hourly_averages"].items()}
+    position = table.schema.get_field_index("timestamp")
+    df = table.remove_column(position).to_pandas(split_blocks=True, self_destruct=False)
+    df.insert(position, "timestamp", _timestamps(table))
+    df.attrs["version"] = version
+    with _state_lock:
+        _aggregates.clear()
+        _aggregates[version] = aggregates
+        _mapped_version = version
+    _ensure_watcher()
+    return df
+
+
+def shared_aggregate(name: str, version: str):
+    """Precomputed aggregate ``name`` for ``version`` (a copy), if mapped."""
+    aggregate = _aggregates.get(version, {}).get(name)
+    return copy.deepcopy(aggregate) if aggregate is not None else None
+
+
+# ---------------------------------------------------------------------------
+# Coordinated reloads
+# ---------------------------------------------------------------------------
+
+def check_for_update() -> bool:
+    """Republish if the source changed; reload if CURRENT moved. True if reloaded."""
+    directory = _directory()
+    try:
+        if current_version(directory) != source_version():
+            publish(directory=directory)
+    except FileNotFoundError:
+        return False  # source briefly missing while being replaced
+    version = current_version(directory)
+    if version is None or version == _mapped_version:
+        return False
+    data.reload_dataset()
+    return True
+
+
+def _watch() -> None:
+    while True:
+        time.sleep(SHARED_POLL_SECONDS)
+        try:
+            check_for_update()
+        except Exception as e:  # keep watching; the next poll retries
+            print(f"[shared] reload check failed: {e}")
+
+
+def _ensure_watcher() -> None:
+    global _watcher
+    if SHARED_POLL_SECONDS <= 0:
+        return
+    with _state_lock:
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch, name="shared-dataset-watcher", daemon=True)
+            _watcher.start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish the dataset for shared-memory workers.")
+    parser.add_argument("command", choices=["publish", "status"])
+    parser.add_argument("--force", action="store_true", help="rewrite even if the version is current")
+    args = parser.parse_args()
+    if not data.SHARED_DATASET_DIR:
+        parser.error("SHARED_DATASET_DIR is not set")
+    if args.command == "publish":
+        print(f"published {publish(force=args.force)} to {_directory()}")
+    else:
+        print(json.dumps({"current": current_version(), "source": source_version()}))
+
+
+if __name__ == "__main__":
+    main()
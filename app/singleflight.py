@@ -0,0 +1,89 @@
+"""In-process single-flight: concurrent calls with the same key share one execution.
+
+The first caller for a key starts the work in the threadpool; callers that
+arrive while it is still running await the same task instead of recomputing.
+The key is released as soon as the task finishes, so results are never cached
+beyond the in-flight window.
+"""
+
+import asyncio
+import hashlib
+import json
+from collections import defaultdict
+from typing import Any, AsyncContextManager, Callable, Hashable
+
+from starlette.concurrency import run_in_threadpool
+
+from app.metrics import SINGLEFLIGHT_CALLS
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls and counts how many were shared."""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._calls: dict[str, int] = defaultdict(int)
+        self._executions: dict[str, int] = defaultdict(int)
+
+    async def do(
+        self,
+        name: str,
+        key: Hashable,
+        fn: Callable[..., Any],
+        *args,
+        guard: Callable[[], AsyncContextManager] | None = None,
+        **kwargs,
+    ) -> Any:
+        """Run ``fn(*args, **kwargs)`` in the threadpool, sharing it per (name, key).
+
+        ``guard`` (e.g. an admission slot) wraps the execution only, so callers
+        that join an in-flight call do not take a slot of their own.
+        """
+        full_key = (name, key)
+        self._calls[name] += 1
+        task = self._inflight.get(full_key)
+        if task is None:
+            self._executions[name] += 1
+            task = asyncio.ensure_future(self._run(guard, fn, *args, **kwargs))
+            self._inflight[full_key] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(full_key, None))
+            SINGLEFLIGHT_CALLS.inc(name=name, outcome="executed")
+        else:
+            SINGLEFLIGHT_CALLS.inc(name=name, outcome="coalesced")
+        # shield: a disconnected caller must not cancel the work for the others
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def _run(guard, fn, *args, **kwargs):
+        if guard is None:
+            return await run_in_threadpool(fn, *args, **kwargs)
+        async with guard():
+            return await run_in_threadpool(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        """Per-name calls, executions and coalesced counts."""
+        return {
+            name: {
+                "calls": self._calls[name],
+                "executions": self._executions[name],
+                "coalesced": self._calls[name] - self._executions[name],
+                "inflight": sum(1 for n, _ in self._inflight if n == name),
+            }
+            for name in sorted(self._calls)
+        }
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a chat query."""
+    return " ".join(query.lower().split())
+
+
+def history_key(chat_history: list[dict] | None) -> str:
+    """Stable digest of a raw chat history payload."""
+    if not chat_history:
+        return ""
+    raw = json.dumps(chat_history, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,98 @@
+"""Startup warm-up and readiness (``/ready``).
+
+Importing the app only loads what every request needs; Plotly and LangChain
+load on first use. The FastAPI lifespan then runs ``warm_up`` in a
+background thread. It loads the dataset, builds the caches the first
+requests hit and renders one small chart, which initializes Plotly and its
+templates. ``/`` answers as soon as the server is up; ``/ready`` returns 503
+until the warm-up has finished.
+"""
+
+import threading
+import time
+import traceback
+
+import pandas as pd
+
+from app.metrics import STARTUP_SECONDS
+
+# Small throwaway chart: loads plotly.express and the plotly_white template
+_DUMMY_CHART = {"chart_type": "line", "title": "warm-up", "data_code": "df", "x": "hour", "y": "value"}
+
+
+class Readiness:
+    """Startup progress: import time, per-step warm-up timings and readiness."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.import_seconds: float | None = None
+        self.ready_seconds: float | None = None
+        self.steps: dict[str, float] = {}
+        self.error: str | None = None
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def imported(self, started: float) -> None:
+        """Record module import time, measured from ``started`` (perf_counter)."""
+        self.started = started
+        self.import_seconds = time.perf_counter() - started
+        STARTUP_SECONDS.set(self.import_seconds, phase="import")
+
+    def step(self, name: str, seconds: float) -> None:
+        self.steps[name] = seconds
+        STARTUP_SECONDS.set(seconds, phase=name)
+
+    def mark_ready(self) -> None:
+        self.ready_seconds = time.perf_counter() - self.started
+        STARTUP_SECONDS.set(self.ready_seconds, phase="ready")
+        self._ready.set()
+
+    def status(self) -> dict:
+        if self.ready:
+            state = "ready"
+        else:
+            state = "failed" if self.error else "starting"
+        return {
+            "status": state,
+            "import_s": _round(self.import_seconds),
+            "time_to_ready_s": _round(self.ready_seconds),
+            "steps_s": {name: _round(seconds) for name, seconds in self.steps.items()},
+            "error": self.error,
+        }
+
+
+def _round(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds, 4)
+
+
+def warm_up(readiness: Readiness) -> None:
+    """Run every warm-up step, recording timings; mark ready unless one fails."""
+    from app.agent import build_chart_from_spec, system_prompt
+    from app.data import dataset_version, filtered_payload, get_data_summary, get_summary_text, load_dataframe
+    from app.incidents import get_incident_detector
+    from app.intents import intent_aggregates
+
+    steps = [
+        ("dataset", load_dataframe),
+        ("summary", lambda: (get_data_summary(), get_summary_text(), system_prompt(dataset_version()))),
+        ("dashboard", filtered_payload),
+        ("intents", intent_aggregates),
+        ("incidents", get_incident_detector),
+        ("chart", lambda: build_chart_from_spec(_DUMMY_CHART, pd.DataFrame({"hour": [0, 1], "value": [0, 1]}))),
+    ]
+    try:
+        for name, fn in steps:
+            start = time.perf_counter()
+            fn()
+            readiness.step(name, time.perf_counter() - start)
+    except Exception as e:
+        traceback.print_exc()
+        readiness.error = f"{name}: {e}"
+        return
+    readiness.mark_ready()
+
+
+readiness = Readiness()
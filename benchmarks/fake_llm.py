@@ -0,0 +1,175 @@
+"""Local OpenAI-compatible chat completions server for offline load tests.
+
+Answers ``POST /v1/chat/completions`` with SYSTEM_PROMPT-conformant JSON
+(``{"explanation": ..., "chart_spec": ...}``) drawn from a weighted mix of
+the prompt's DATA CODE EXAMPLES, plus optional ``text`` (no chart),
+``invalid`` (non-JSON) and ``error`` (HTTP 500) responses. Latency is
+``latency_ms ± jitter_ms`` before the first token; with ``"stream": true``
+the content is sent as SSE chunks spaced by ``chunk_delay_ms``.
+
+Usage:
+    python -m benchmarks.fake_llm --port 8001 --latency-ms 800 --mix hourly_avg=3,time_series=2,text=1
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.run import chart_recipes
+
+SPECIAL_KINDS = ("text", "invalid", "error")
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """Parse ``name=weight,name=weight`` into a dict; bare names get weight 1."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight) if weight else 1.0
+    if not mix or any(w < 0 for w in mix.values()) or not sum(mix.values()):
+        raise ValueError(f"Invalid mix: {text!r}")
+    return mix
+
+
+@dataclass
+class FakeLLMConfig:
+    mix: dict[str, float] = field(default_factory=dict)  # empty = all recipes, equal weight
+    latency_ms: float = 500
+    jitter_ms: float = 0
+    chunk_delay_ms: float = 10
+    chunk_size: int = 16
+    seed: int | None = None
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def create_app(config: FakeLLMConfig | None = None) -> FastAPI:
+    config = config or FakeLLMConfig()
+    recipes = dict(chart_recipes())
+    mix = config.mix or {name: 1.0 for name in recipes}
+    unknown = set(mix) - set(recipes) - set(SPECIAL_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown mix entries: {sorted(unknown)}; choose from {sorted(recipes) + list(SPECIAL_KINDS)}")
+    kinds, weights = list(mix), list(mix.values())
+    rng = random.Random(config.seed)
+
+    app = FastAPI(title="Fake OpenAI")
+    app.state.counts = {kind: 0 for kind in kinds}
+
+    def content_for(kind: str) -> str:
+        if kind == "text":
+            return json.dumps({"explanation": "The data does not need a chart to answer this.", "chart_spec": None})
+        if kind == "invalid":
+            return "Sorry, I can only describe the chart in words."
+        spec = recipes[kind]
+        return json.dumps({"explanation": f"{spec['title']} of visible stores.", "chart_spec": spec})
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "local"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        kind = rng.choices(kinds, weights)[0]
+        app.state.counts[kind] += 1
+        delay = max(0.0, config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        if kind == "error":
+            return JSONResponse({"error": {"message": "fake upstream error", "type": "server_error"}}, status_code=500)
+
+        content = content_for(kind)
+        model = body.get("model", "fake")
+        prompt_tokens = sum(_count_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _count_tokens(content),
+            "total_tokens": prompt_tokens + _count_tokens(content),
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        async def events():
+            def chunk(delta: dict, finish: str | None = None, **extra) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                    **extra,
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for i in range(0, len(content), config.chunk_size):
+                if i and config.chunk_delay_ms:
+                    await asyncio.sleep(config.chunk_delay_ms / 1000)
+                yield chunk({"content": content[i:i + config.chunk_size]})
+            yield chunk({}, "stop")
+            if include_usage:
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {"responses": app.state.counts}
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake OpenAI-compatible chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--mix", default="", help="e.g. hourly_avg=3,time_series=2,text=1,error=0.1")
+    parser.add_argument("--latency-ms", type=float, default=500, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--chunk-delay-ms", type=float, default=10, help="delay between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        mix=parse_mix(args.mix) if args.mix else {},
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        chunk_delay_ms=args.chunk_delay_ms,
+        chunk_size=args.chunk_size,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
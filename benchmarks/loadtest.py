@@ -0,0 +1,282 @@
+"""Closed-loop load driver replaying dashboard and chat traffic against the API.
+
+Each of ``--concurrency`` virtual users loops until ``--duration`` seconds
+(or ``--requests`` in total) have elapsed, picking a request kind from the
+weighted ``--mix``:
+
+- ``filtered``: /api/data/filtered with a random date window and hour range
+- ``delta``: /api/data/filtered?since=<cursor> from that user's last response
+  (the dashboard auto-refresh); falls back to ``filtered`` without a cursor
+- ``summary``: /api/data/summary
+- ``chat``: POST /api/query with a frontend example question (answered by
+  the intent router) or, with probability ``--chat-llm-share``, a question
+  the router leaves to the LLM
+
+Throughput, p50/p95/p99 latency and error rate are reported per kind and
+overall, and chat is also split into ``routed`` and ``llm`` paths. A chat
+response with a non-null ``error`` counts as an error. When the server runs
+with ``INTENT_ROUTER_ENABLED=0`` every chat request is counted as ``llm``.
+Point the app at benchmarks.fake_llm to load-test chat offline:
+
+    python -m benchmarks.fake_llm --port 8001 --latency-ms 800 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=fake uvicorn app.main:app &
+    python -m benchmarks.loadtest --concurrency 32 --duration 60 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from benchmarks.fake_llm import parse_mix
+
+DEFAULT_MIX = "filtered=5,delta=2,summary=1,chat=2"
+KINDS = ("filtered", "delta", "summary", "chat")
+CHAT_PATHS = ("routed", "llm")
+DEFAULT_CHAT_LLM_SHARE = 0.5
+
+# frontend.py example_queries plus Spanish variants users actually type (intent router)
+ROUTED_QUERIES = [
+    "Show me the trend of visible stores over time",
+    "What's the average number of visible stores per hour?",
+    "Show the daily average of visible stores",
+    "Which hour of the day has the most visible stores?",
+    "Show me the distribution of values",
+    "Compare the first 3 days vs the last 3 days",
+    "Show a heatmap of stores by day and hour",
+    "¿Cuál es el promedio de tiendas visibles por hora?",
+    "Muéstrame el promedio diario de tiendas visibles",
+    "¿A qué hora hay más tiendas visibles?",
+]
+# Follow-up style questions the router leaves to the LLM
+LLM_QUERIES = [
+    "Why did visible stores drop on February 10?",
+    "Compare weekdays with weekends by hour",
+    "Which hour has the fewest visible stores?",
+    "Show the hourly average for the first day",
+    "Plot the hourly average as a line chart",
+    "Compare the first day with the last day",
+    "What is the median number of visible stores per day?",
+    "¿Por qué bajaron las tiendas visibles el 8 de febrero?",
+    "¿A qué hora hay menos tiendas visibles?",
+    "Muestra el promedio por hora solo para el fin de semana",
+]
+
+
+@dataclass
+class Sample:
+    kind: str
+    latency_ms: float
+    error: str | None
+    bytes: int
+    path: str | None = None  # chat only: "routed" or "llm"
+
+
+class VirtualUser:
+    """One dashboard session: remembers its last filters and cursor for delta refreshes."""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        days: list[str],
+        rng: random.Random,
+        chat_llm_share: float = DEFAULT_CHAT_LLM_SHARE,
+        router_enabled: bool = True,
+    ):
+        self.client = client
+        self.days = days
+        self.rng = rng
+        self.chat_llm_share = chat_llm_share
+        self.router_enabled = router_enabled
+        self.cursor: str | None = None
+        self.params: dict = {}  # filters the cursor is bound to
+
+    def _window(self) -> dict:
+        first = self.rng.randrange(len(self.days))
+        last = self.rng.randrange(first, len(self.days))
+        params = {"date_start": self.days[first], "date_end": self.days[last], "max_points": "2000"}
+        if self.rng.random() < 0.3:
+            hour_start = self.rng.randrange(24)
+            params.update(hour_start=hour_start, hour_end=self.rng.randrange(hour_start, 24))
+        return params
+
+    async def request(self, kind: str) -> Sample:
+        if kind == "delta" and self.cursor is None:
+            kind = "filtered"
+        start = time.perf_counter()
+        error = None
+        size = 0
+        path = None
+        try:
+            if kind == "summary":
+                response = await self.client.get("/api/data/summary")
+            elif kind == "chat":
+                llm = self.rng.random() < self.chat_llm_share
+                query = self.rng.choice(LLM_QUERIES if llm else ROUTED_QUERIES)
+                path = "llm" if llm or not self.router_enabled else "routed"
+                response = await self.client.post("/api/query", json={"query": query})
+            else:
+                # A cursor only yields a delta with the filters it was issued for
+                params = {**self.params, "since": self.cursor} if kind == "delta" else self._window()
+                response = await self.client.get("/api/data/filtered", params=params)
+            size = len(response.content)
+            if response.status_code >= 400:
+                error = f"http_{response.status_code}"
+            else:
+                body = response.json()
+                if kind == "chat" and body.get("error"):
+                    error = "app_error"
+                elif kind in ("filtered", "delta"):
+                    if kind == "delta" and not body.get("delta"):
+                        error = "not_delta"  # server fell back to a full payload
+                    if body.get("cursor"):
+                        self.cursor = body["cursor"]
+                        self.params = {k: v for k, v in params.items() if k != "since"}
+        except httpx.HTTPError as e:
+            error = f"exception:{type(e).__name__}"
+        return Sample(kind, (time.perf_counter() - start) * 1000, error, size, path)
+
+
+async def run_load(
+    base_url: str,
+    concurrency: int,
+    duration: float | None = None,
+    total_requests: int | None = None,
+    mix: dict[str, float] | None = None,
+    timeout: float = 120,
+    seed: int | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+    chat_llm_share: float = DEFAULT_CHAT_LLM_SHARE,
+) -> dict:
+    """Drive load and return the report dict."""
+    mix = mix or parse_mix(DEFAULT_MIX)
+    unknown = set(mix) - set(KINDS)
+    if unknown:
+        raise ValueError(f"Unknown request kinds: {sorted(unknown)}; choose from {list(KINDS)}")
+    if duration is None and total_requests is None:
+        raise ValueError("Give a duration or a request count")
+    if not 0 <= chat_llm_share <= 1:
+        raise ValueError("chat_llm_share must be between 0 and 1")
+    kinds, weights = list(mix), list(mix.values())
+    rng = random.Random(seed)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, transport=transport) as client:
+        summary = (await client.get("/api/data/summary")).raise_for_status().json()
+        start_day = pd.Timestamp(summary["date_range"]["start"][:10])
+        end_day = pd.Timestamp(summary["date_range"]["end"][:10])
+        days = [str(d.date()) for d in pd.date_range(start_day, end_day, freq="D")]
+        stats = (await client.get("/api/stats")).raise_for_status().json()
+        router_enabled = stats.get("intent_router", {}).get("enabled", True)
+
+        samples: list[Sample] = []
+        issued = 0
+        started = time.perf_counter()
+        deadline = started + duration if duration is not None else None
+
+        async def worker(user: VirtualUser) -> None:
+            nonlocal issued
+            while True:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                if total_requests is not None:
+                    if issued >= total_requests:
+                        return
+                    issued += 1
+                samples.append(await user.request(rng.choices(kinds, weights)[0]))
+
+        users = [
+            VirtualUser(client, days, random.Random(rng.random()), chat_llm_share, router_enabled)
+            for _ in range(concurrency)
+        ]
+        await asyncio.gather(*(worker(u) for u in users))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "config": {
+            "base_url": base_url,
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "requests": total_requests,
+            "mix": mix,
+            "chat_llm_share": chat_llm_share,
+            "router_enabled": router_enabled,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "overall": summarize(samples, elapsed),
+        "by_kind": {
+            kind: summarize([s for s in samples if s.kind == kind], elapsed)
+            for kind in KINDS if any(s.kind == kind for s in samples)
+        },
+        "chat_paths": {
+            path: summarize([s for s in samples if s.path == path], elapsed)
+            for path in CHAT_PATHS if any(s.path == path for s in samples)
+        },
+    }
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    """Throughput, latency percentiles and error rate for a set of samples."""
+    if not samples:
+        return {"requests": 0}
+    ms = np.array([s.latency_ms for s in samples])
+    errors = Counter(s.error for s in samples if s.error)
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+        "error_rate": round(sum(errors.values()) / len(samples), 4),
+        "errors": dict(errors),
+        "mean_bytes": int(np.mean([s.bytes for s in samples])),
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"{'kind':<12} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>7}")
+    chat_paths = [(f"chat:{path}", s) for path, s in report.get("chat_paths", {}).items()]
+    rows = [*report["by_kind"].items(), *chat_paths, ("overall", report["overall"])]
+    for kind, s in rows:
+        if not s["requests"]:
+            continue
+        print(f"{kind:<12} {s['requests']:>7} {s['throughput_rps']:>8.1f} {s['p50_ms']:>9.1f} "
+              f"{s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f} {s['error_rate'] * 100:>7.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the dashboard API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default 30)")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted kinds from {', '.join(KINDS)}")
+    parser.add_argument("--chat-llm-share", type=float, default=DEFAULT_CHAT_LLM_SHARE,
+                        help="fraction of chat requests the intent router cannot answer")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout (frontend uses 120s)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="write the report JSON here")
+    args = parser.parse_args()
+
+    duration = args.duration if args.duration is not None or args.requests is not None else 30
+    report = asyncio.run(run_load(
+        args.url, args.concurrency, duration, args.requests, parse_mix(args.mix), args.timeout, args.seed,
+        chat_llm_share=args.chat_llm_share,
+    ))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
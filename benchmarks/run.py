@@ -0,0 +1,286 @@
+"""Benchmarks for the data and chart hot paths at 1×, 10× and 100× history.
+
+Usage:
+    python -m benchmarks.run --scales 1 10 --repeats 10 --output bench.json
+    python -m benchmarks.run --scales 1 --only data_filtered chart
+    python -m benchmarks.run --compare old.json new.json
+
+Scale 1 uses availability_clean.parquet; larger scales use synthetic data
+from benchmarks.synthetic. Each case reports latency percentiles (ms), peak
+traced memory (bytes) and payload size (bytes). The JSON output can be
+compared across commits with --compare.
+
+The ``startup.*`` cases start fresh interpreters that import ``app.main`` and
+run the startup warm-up: ``startup.import`` is the import time,
+``startup.warmup`` the warm-up and ``startup.time_to_ready`` the wall time
+from process spawn to ready. Peak memory for these is the process's max RSS.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import app.data as data
+from app.config import PARQUET_PATH
+from benchmarks.synthetic import generate
+
+
+# ---------------------------------------------------------------------------
+# Dataset handling
+# ---------------------------------------------------------------------------
+
+def use_dataset(path: str) -> None:
+    """Point app.data at ``path`` and drop every cache derived from the old data."""
+    data.PARQUET_PATH = path
+    data.reload_dataset()
+
+
+def dataset_for_scale(scale: float, workdir: Path) -> str:
+    if scale == 1:
+        return PARQUET_PATH
+    path = workdir / f"availability_x{scale:g}.parquet"
+    if not path.exists():
+        generate(scale, source=pd.read_parquet(PARQUET_PATH)).to_parquet(path, index=False)
+    return str(path)
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+def chart_recipes() -> list[tuple[str, dict]]:
+    """Chart specs for the DATA CODE EXAMPLES listed in the agent SYSTEM_PROMPT."""
+    from app.agent import SYSTEM_PROMPT
+
+    block = SYSTEM_PROMPT.split("DATA CODE EXAMPLES:", 1)[1].strip().split("\n\n", 1)[0]
+    recipes = []
+    for line in block.splitlines():
+        label, code = line.lstrip("- ").split(":", 1)
+        code = code.strip()
+        name = label.split("(")[0].strip().lower().replace(" + ", "_").replace(" ", "_")
+        if code == "df[['value']]":
+            spec = {"chart_type": "histogram", "x": "value", "y": "value"}
+        else:
+            x = "date" if "date=" in code else "timestamp" if "resample" in code else "hour"
+            spec = {"chart_type": "line" if "resample" in code else "bar", "x": x, "y": "value"}
+        spec.update({"title": label, "data_code": code})
+        recipes.append((name, spec))
+    return recipes
+
+
+def build_cases() -> list[tuple[str, Callable[[], object]]]:
+    """(name, fn) pairs; each fn returns the payload it produced."""
+    from app.agent import build_chart_from_spec
+    from app.export import export_stream
+    from app.incidents import IncidentDetector, build_baseline
+
+    df = data.load_dataframe()
+    last_day = str(df["timestamp"].max().date())
+    cursor = data.filtered_payload()["cursor"]
+
+    def cold_load():
+        data.load_dataframe.cache_clear()
+        return data.load_dataframe()
+
+    def incidents():
+        detector = IncidentDetector(build_baseline(df))
+        detector.update(df[["timestamp", "value"]])
+        return detector.query()
+
+    cases = [
+        ("load_dataframe", cold_load),
+        ("data_filtered.full", lambda: data.filtered_payload()),
+        ("data_filtered.one_day", lambda: data.filtered_payload(date_start=last_day, date_end=last_day)),
+        ("data_filtered.delta", lambda: data.filtered_payload(since=cursor)),
+        ("get_data_summary", data.get_data_summary),
+        ("get_summary_text", data.get_summary_text),
+        ("incidents.detect", incidents),
+        ("export.ndjson", lambda: sum(len(chunk) for chunk in export_stream("ndjson"))),
+    ]
+    for name, spec in chart_recipes():
+        cases.append((f"chart.{name}", lambda spec=spec: build_chart_from_spec(spec)))
+    return cases
+
+
+def payload_bytes(result) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, int):  # already a byte count (streamed payloads)
+        return result
+    if isinstance(result, (bytes, str)):
+        return len(result.encode() if isinstance(result, str) else result)
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    return len(json.dumps(result, default=str))
+
+
+def latency_stats(timings: list[float]) -> dict:
+    ms = np.array(timings)
+    return {
+        "repeats": len(timings),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "min_ms": round(float(ms.min()), 3),
+    }
+
+
+def measure(fn: Callable[[], object], repeats: int) -> dict:
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {**latency_stats(timings), "peak_mem_bytes": int(peak), "payload_bytes": payload_bytes(result)}
+
+
+# ---------------------------------------------------------------------------
+# Startup (fresh interpreters)
+# ---------------------------------------------------------------------------
+
+_STARTUP_SCRIPT = """
+import json, resource, time
+import app.main
+from app.warmup import readiness, warm_up
+warm_up(readiness)
+print(json.dumps({
+    "ready_at": time.time(),
+    "import_s": readiness.import_seconds,
+    "warmup_s": readiness.ready_seconds - readiness.import_seconds,
+    "maxrss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    "error": readiness.error,
+}))
+"""
+
+STARTUP_CASES = ("startup.import", "startup.warmup", "startup.time_to_ready")
+
+
+def measure_startup(parquet_path: str, repeats: int) -> dict[str, dict]:
+    """Import, warm-up and spawn-to-ready times over ``repeats`` fresh processes."""
+    env = {**os.environ, "PARQUET_PATH": str(Path(parquet_path).resolve())}
+    root = Path(__file__).resolve().parent.parent
+    runs = []
+    for _ in range(repeats):
+        spawned = time.time()
+        out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], cwd=root, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        if result["error"]:
+            raise RuntimeError(f"warm-up failed: {result['error']}")
+        result["ready_s"] = result["ready_at"] - spawned
+        runs.append(result)
+
+    peak = max(r["maxrss_bytes"] for r in runs)
+    return {
+        name: {**latency_stats([r[key] * 1000 for r in runs]), "peak_mem_bytes": peak, "payload_bytes": 0}
+        for name, key in zip(STARTUP_CASES, ("import_s", "warmup_s", "ready_s"))
+    }
+
+
+# ---------------------------------------------------------------------------
+# Runner / comparison
+# ---------------------------------------------------------------------------
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _selected(name: str, only: list[str] | None) -> bool:
+    return not only or any(name.startswith(prefix) for prefix in only)
+
+
+def run(scales: list[float], repeats: int, only: list[str] | None = None, startup_repeats: int = 5) -> dict:
+    results = []
+    original = data.PARQUET_PATH
+
+    def record(name: str, scale: float, rows: int, stats: dict) -> None:
+        results.append({"name": name, "scale": scale, "rows": rows, **stats})
+        print(f"{name:<28} x{scale:<5g} p50={stats['p50_ms']:>10.2f}ms "
+              f"p95={stats['p95_ms']:>10.2f}ms peak={stats['peak_mem_bytes'] / 1e6:>8.1f}MB "
+              f"payload={stats['payload_bytes']:>11,}B")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            for scale in scales:
+                path = dataset_for_scale(scale, Path(tmp))
+                use_dataset(path)
+                rows = len(data.load_dataframe())
+                for name, fn in build_cases():
+                    if _selected(name, only):
+                        record(name, scale, rows, measure(fn, repeats))
+                if startup_repeats and any(_selected(name, only) for name in STARTUP_CASES):
+                    for name, stats in measure_startup(path, startup_repeats).items():
+                        if _selected(name, only):
+                            record(name, scale, rows, stats)
+        finally:
+            use_dataset(original)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+
+
+def compare(base_path: str, new_path: str) -> None:
+    """Print p50/peak-memory ratios (new / base) for cases present in both files."""
+    base = {(r["name"], r["scale"]): r for r in json.loads(Path(base_path).read_text())["results"]}
+    new = {(r["name"], r["scale"]): r for r in json.loads(Path(new_path).read_text())["results"]}
+    print(f"{'case':<28} {'scale':>6} {'p50 base':>10} {'p50 new':>10} {'ratio':>7} {'mem ratio':>9}")
+    for key in sorted(base.keys() & new.keys()):
+        b, n = base[key], new[key]
+        ratio = n["p50_ms"] / b["p50_ms"] if b["p50_ms"] else float("nan")
+        mem = n["peak_mem_bytes"] / b["peak_mem_bytes"] if b["peak_mem_bytes"] else float("nan")
+        print(f"{key[0]:<28} {key[1]:>6g} {b['p50_ms']:>10.2f} {n['p50_ms']:>10.2f} {ratio:>7.2f} {mem:>9.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark data and chart hot paths.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--only", nargs="+", default=None, help="case name prefixes to run")
+    parser.add_argument("--startup-repeats", type=int, default=5,
+                        help="fresh processes per scale for the startup.* cases (0 to skip)")
+    parser.add_argument("--output", default=None, help="write results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), default=None)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.scales, args.repeats, args.only, args.startup_repeats)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Synthetic availability datasets at N× the history of availability_clean.parquet.
+
+Each synthetic day copies the intra-day samples of a real, complete day with
+the same weekday, so the daily cycle, the nightly monitoring gap and the
+weekday/weekend pattern are preserved. A per-day level factor and a small
+per-sample jitter keep days from being exact duplicates. The output has the
+same columns and dtypes as the real parquet.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from app.config import PARQUET_PATH
+
+MIN_DAY_ROWS = 5_000  # skip partial days (e.g. Feb 11) as templates
+
+
+def _day_templates(df: pd.DataFrame) -> dict[int, list[tuple[np.ndarray, np.ndarray]]]:
+    """Map weekday -> list of (seconds since midnight, values) of complete real days."""
+    local = df["timestamp"].dt.tz_localize(None)
+    day = local.dt.normalize()
+    templates: dict[int, list] = {}
+    for date, idx in df.groupby(day).indices.items():
+        if len(idx) < MIN_DAY_ROWS:
+            continue
+        offsets = ((local.iloc[idx] - date).dt.total_seconds()).to_numpy(dtype=np.int64)
+        values = df["value"].to_numpy()[idx]
+        templates.setdefault(date.dayofweek, []).append((offsets, values))
+    return templates
+
+
+def generate(scale: float, source: pd.DataFrame | None = None, seed: int = 0) -> pd.DataFrame:
+    """Return a dataset covering ``scale`` × the source's number of days."""
+    if source is None:
+        source = pd.read_parquet(PARQUET_PATH)
+    source = source.sort_values("timestamp").reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    tz = source["timestamp"].dt.tz
+    templates = _day_templates(source)
+
+    first_day = source["timestamp"].dt.tz_localize(None).min().normalize()
+    n_days = max(1, int(round(source["timestamp"].dt.date.nunique() * scale)))
+
+    ts_parts, value_parts = [], []
+    for d in range(n_days):
+        date = first_day + pd.Timedelta(days=d)
+        options = templates[date.dayofweek]
+        offsets, values = options[rng.integers(len(options))]
+        level = rng.normal(1.0, 0.03)
+        jitter = rng.normal(1.0, 0.002, size=values.size)
+        ts_parts.append(date.value // 10**9 + offsets)
+        value_parts.append(np.maximum(values * level * jitter, 0).round().astype(np.int64))
+
+    seconds = np.concatenate(ts_parts)
+    timestamps = pd.to_datetime(seconds, unit="s").tz_localize(tz).astype(source["timestamp"].dtype)
+    out = pd.DataFrame({
+        "Plot name": source["Plot name"].iloc[0],
+        "metric (sf_metric)": source["metric (sf_metric)"].iloc[0],
+        "timestamp": timestamps,
+        "value": np.concatenate(value_parts),
+        "hour": timestamps.hour.astype("int32"),
+    }, index=pd.RangeIndex(seconds.size))
+    return out.astype({c: source[c].dtype for c in source.columns})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic availability parquet.")
+    parser.add_argument("--scale", type=float, default=10, help="multiple of the real history length")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    df = generate(args.scale, seed=args.seed)
+    output = args.output or f"availability_x{args.scale:g}.parquet"
+    df.to_parquet(output, index=False)
+    print(f"wrote {len(df):,} rows to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -130,6 +130,9 @@ if query:
                         "content": explanation,
                         "chart": chart_json,
                     })
+                elif response.status_code in (429, 503):
+                    retry_after = response.headers.get("Retry-After", "a few")
+                    st.warning(f"⏳ The assistant is busy right now. Please retry in {retry_after} seconds.")
                 else:
                     error_detail = response.json().get("detail", "Unknown error")
                     st.error(f"❌ API Error: {error_detail}")
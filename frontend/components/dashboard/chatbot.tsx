@@ -47,6 +47,18 @@ export function Chatbot({ onChartUpdate }: ChatbotProps) {
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ query: text.trim(), chat_history: history }),
       });
+      if (res.status === 429 || res.status === 503) {
+        const retryAfter = res.headers.get("Retry-After") ?? "unos";
+        setMessages((prev) => [
+          ...prev,
+          {
+            id: (Date.now() + 1).toString(),
+            role: "assistant",
+            text: `El asistente está ocupado. Intenta de nuevo en ${retryAfter} segundos.`,
+          },
+        ]);
+        return;
+      }
       const data = await res.json();
       const assistantMsg: ChatMessage = {
         id: (Date.now() + 1).toString(),
@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useCallback, useEffect } from "react";
+import { useState, useCallback, useEffect, useRef } from "react";
 import { DashboardHeader } from "./dashboard-header";
 import { KpiCards } from "./kpi-cards";
 import { AvailabilityChart } from "./availability-chart";
@@ -20,6 +20,31 @@ interface FilteredData {
   hourly_avg: HourlyAvgPoint[];
 }
 
+interface FilteredResponse extends FilteredData {
+  delta?: boolean;
+  cursor?: string;
+}
+
+const AUTO_REFRESH_MS = 15000;
+
+// Replace rows with the same key and append new ones, keeping key order
+function mergeBy<T>(rows: T[], updates: T[], key: (row: T) => string): T[] {
+  const merged = new Map(rows.map((r) => [key(r), r]));
+  for (const u of updates) merged.set(key(u), u);
+  return Array.from(merged.entries())
+    .sort(([a], [b]) => (a < b ? -1 : a > b ? 1 : 0))
+    .map(([, r]) => r);
+}
+
+function applyDelta(prev: FilteredData, delta: FilteredResponse): FilteredData {
+  return {
+    kpis: delta.kpis,
+    time_series: mergeBy(prev.time_series, delta.time_series, (r) => r.timestamp),
+    heatmap: mergeBy(prev.heatmap, delta.heatmap, (r) => `${r.day}|${String(r.hour).padStart(2, "0")}`),
+    hourly_avg: mergeBy(prev.hourly_avg, delta.hourly_avg, (r) => String(r.hour).padStart(2, "0")),
+  };
+}
+
 export function DashboardContent() {
   const [dateStart, setDateStart] = useState("2026-02-01");
   const [dateEnd, setDateEnd] = useState("2026-02-11");
@@ -29,7 +54,10 @@ export function DashboardContent() {
   const [data, setData] = useState<FilteredData | null>(null);
   const [chatChart, setChatChart] = useState<string | null>(null);
 
-  const fetchData = useCallback(async () => {
+  const cursorRef = useRef<string | null>(null);
+
+  // Full load when filters change; later refreshes only fetch what changed
+  const fetchData = useCallback(async (incremental = false) => {
     setLoading(true);
     try {
       const params = new URLSearchParams({
@@ -37,11 +65,13 @@ export function DashboardContent() {
         date_end: dateEnd,
         hour_start: hourStart.toString(),
         hour_end: hourEnd.toString(),
-        resample: "5min",
+        max_points: "2000",
       });
+      if (incremental && cursorRef.current) params.set("since", cursorRef.current);
       const res = await fetch(`/api/data/filtered?${params}`);
-      const json = await res.json();
-      setData(json);
+      const json: FilteredResponse = await res.json();
+      cursorRef.current = json.cursor ?? null;
+      setData((prev) => (json.delta && prev ? applyDelta(prev, json) : json));
     } catch (e) {
       console.error("Failed to fetch data:", e);
     } finally {
@@ -49,8 +79,19 @@ export function DashboardContent() {
     }
   }, [dateStart, dateEnd, hourStart, hourEnd]);
 
+  const refreshData = useCallback(() => fetchData(true), [fetchData]);
+
   // Initial load
-  useEffect(() => { fetchData(); }, [fetchData]);
+  useEffect(() => {
+    cursorRef.current = null;
+    fetchData();
+  }, [fetchData]);
+
+  // Auto-refresh with delta fetches
+  useEffect(() => {
+    const id = setInterval(refreshData, AUTO_REFRESH_MS);
+    return () => clearInterval(id);
+  }, [refreshData]);
 
   return (
     <>
@@ -59,7 +100,7 @@ export function DashboardContent() {
         hourStart={hourStart} hourEnd={hourEnd}
         onDateStartChange={setDateStart} onDateEndChange={setDateEnd}
         onHourStartChange={setHourStart} onHourEndChange={setHourEnd}
-        onRefresh={fetchData} loading={loading}
+        onRefresh={refreshData} loading={loading}
       />
       <div className="mx-auto max-w-7xl px-6 py-6 space-y-6">
         {/* KPI Cards */}
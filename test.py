@@ -1,13 +1,20 @@
 """Tests for the RappiMakers AI Dashboard."""
 
+import asyncio
 import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
 import pytest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 
 from app.main import app
-from app.data import load_dataframe, get_data_summary, get_summary_text
+from app.data import load_dataframe, get_data_summary, get_summary_text, choose_resolution
 from app.agent import build_chart_from_spec
+from app.incidents import IncidentDetector, build_baseline, find_runs, get_incident_detector
 
 
 # ---------------------------------------------------------------------------
@@ -343,3 +350,1299 @@ class TestChartPipeline:
         fig_data = json.loads(result)
 
         assert "data" in fig_data
+
+
+# ===========================================================================
+# INCIDENT DETECTION TESTS
+# ===========================================================================
+
+class TestIncidents:
+    """Tests for the run-length incident detector."""
+
+    def test_find_runs(self):
+        """Test run boundaries, including a forced break."""
+        mask = np.array([0, 1, 1, 0, 1, 1, 1, 0, 1], dtype=bool)
+        starts, ends = find_runs(mask)
+        assert starts.tolist() == [1, 4, 8]
+        assert ends.tolist() == [2, 6, 8]
+
+        breaks = np.zeros(len(mask), dtype=bool)
+        breaks[5] = True
+        starts, ends = find_runs(mask, breaks)
+        assert starts.tolist() == [1, 4, 5, 8]
+        assert ends.tolist() == [2, 4, 6, 8]
+
+    def test_incremental_matches_full_pass(self):
+        """Test that chunked updates produce the same incidents as one pass."""
+        df = load_dataframe().sort_values("timestamp")
+        detector = IncidentDetector(build_baseline(df))
+        for idx in np.array_split(np.arange(len(df)), 37):
+            detector.update(df.iloc[idx][["timestamp", "value"]])
+        assert detector.query() == get_incident_detector().query()
+
+    def test_detects_known_outage(self):
+        """Test that the Feb 10 afternoon dip and the Feb 8 sampling gap are found."""
+        detector = get_incident_detector()
+        drops = detector.query(
+            pd.Timestamp("2026-02-10 15:00", tz=detector.tz),
+            pd.Timestamp("2026-02-10 17:00", tz=detector.tz),
+            kind="drop",
+        )
+        assert any(inc["duration_s"] > 3600 for inc in drops)
+        gaps = detector.query(
+            pd.Timestamp("2026-02-08", tz=detector.tz),
+            pd.Timestamp("2026-02-09", tz=detector.tz),
+            kind="gap",
+        )
+        assert any(inc["duration_s"] > 3000 for inc in gaps)
+
+    def test_daily_ramps_are_not_drops(self):
+        """Test the routine 00:0x, 06:11 and 08:00 ramps are not flagged, but real dips are."""
+        drops = get_incident_detector().query(kind="drop")
+        starts = [pd.Timestamp(inc["start"]) for inc in drops]
+        assert not any(ts.hour == 8 and ts.minute < 5 for ts in starts)
+        assert not any(ts.hour == 0 and ts.minute < 10 for ts in starts)
+        assert sum(ts.hour == 6 and 10 <= ts.minute < 13 for ts in starts) <= 1  # only the slow Feb 5 morning
+        assert len(drops) < 10
+
+    def test_nightly_window_is_not_a_gap(self):
+        """Test that the 01:00-06:00 monitoring window is not reported."""
+        for inc in get_incident_detector().query(kind="gap"):
+            assert inc["duration_s"] <= 4 * 3600
+
+    def test_incidents_endpoint(self):
+        """Test the /api/incidents endpoint."""
+        response = client.get("/api/incidents?date_start=2026-02-10&date_end=2026-02-10")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["stats"]["count"] == len(data["incidents"]) > 0
+        assert data["stats"]["mttr_s"] > 0
+        for inc in data["incidents"]:
+            assert inc["end"] >= "2026-02-10"
+            assert inc["start"] < "2026-02-11"
+
+    def test_incidents_endpoint_bad_date(self):
+        """Test unparseable dates are a client error, not a 500."""
+        assert client.get("/api/incidents?date_start=notadate").status_code == 400
+        assert client.get("/api/incidents?date_end=2026-13-45").status_code == 400
+
+    def test_incidents_endpoint_bad_kind(self):
+        """Test that an unknown kind is rejected."""
+        response = client.get("/api/incidents?kind=foo")
+        assert response.status_code == 422
+
+
+# ===========================================================================
+# EXPORT TESTS
+# ===========================================================================
+
+class TestExport:
+    """Tests for the streaming /api/data/export endpoint."""
+
+    def test_export_ndjson_range_and_projection(self):
+        """Test NDJSON export with a date range and column projection."""
+        response = client.get(
+            "/api/data/export?format=ndjson&date_start=2026-02-03&date_end=2026-02-03"
+            "&columns=timestamp,value&batch_size=500"
+        )
+        assert response.status_code == 200
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == 6413
+        assert set(rows[0]) == {"timestamp", "value"}
+        assert rows[0]["timestamp"].startswith("2026-02-03")
+        assert [r["timestamp"] for r in rows] == sorted(r["timestamp"] for r in rows)
+
+    def test_export_csv_single_header(self):
+        """Test CSV export emits one header across batches."""
+        response = client.get("/api/data/export?format=csv&columns=timestamp,value&batch_size=1000")
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert lines[0] == "timestamp,value"
+        assert lines.count("timestamp,value") == 1
+        assert len(lines) == len(load_dataframe()) + 1
+
+    def test_export_arrow_roundtrip(self):
+        """Test Arrow IPC export can be read back."""
+        import pyarrow as pa
+        response = client.get("/api/data/export?format=arrow&date_start=2026-02-11")
+        assert response.status_code == 200
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.num_rows == 3213
+        assert table.column_names == list(load_dataframe().columns)
+
+    def test_export_empty_range(self):
+        """Test an empty range still returns a valid Arrow stream."""
+        import pyarrow as pa
+        response = client.get("/api/data/export?format=arrow&date_start=2030-01-01")
+        assert pa.ipc.open_stream(response.content).read_all().num_rows == 0
+
+    @pytest.mark.parametrize("date_start,date_end", [
+        (None, None), ("2026-02-03", "2026-02-05"), ("2026-02-11", None), ("2026-02-05", "2026-02-03"),
+    ])
+    def test_select_rows_is_a_row_range(self, date_start, date_end):
+        """Test the export range is found by binary search and equals the timestamp filter."""
+        from app.export import select_rows
+
+        df, rows, _ = select_rows(date_start, date_end)
+        tz = df["timestamp"].dt.tz
+        mask = pd.Series(True, index=df.index)
+        if date_start:
+            mask &= df["timestamp"] >= pd.Timestamp(date_start, tz=tz)
+        if date_end:
+            mask &= df["timestamp"] < pd.Timestamp(date_end, tz=tz) + pd.Timedelta(days=1)
+        assert isinstance(rows, range)
+        assert list(rows) == np.flatnonzero(mask.to_numpy()).tolist()
+
+    def test_export_unknown_column(self):
+        """Test that unknown columns return 400."""
+        response = client.get("/api/data/export?columns=nope")
+        assert response.status_code == 400
+
+
+# ===========================================================================
+# RESOLUTION / POINT BUDGET TESTS
+# ===========================================================================
+
+class TestResolution:
+    """Tests for max_points auto-resolution on /api/data/filtered."""
+
+    def test_choose_resolution_fits_budget(self):
+        """Test the finest level that fits the budget is chosen."""
+        assert choose_resolution(pd.Timedelta(days=10), 2000)[0] == "15min"
+        assert choose_resolution(pd.Timedelta(hours=1), 2000)[0] == "10s"
+        assert choose_resolution(pd.Timedelta(days=10), 5)[0] == "1D"
+
+    def test_choose_resolution_requested_is_minimum(self):
+        """Test a requested frequency is honoured unless it exceeds the budget."""
+        assert choose_resolution(pd.Timedelta(days=1), 2000, "30min")[0] == "30min"
+        assert choose_resolution(pd.Timedelta(days=10), 2000, "10s")[0] == "15min"
+
+    def test_choose_resolution_invalid(self):
+        """Test invalid frequencies raise ValueError."""
+        with pytest.raises(ValueError):
+            choose_resolution(pd.Timedelta(days=1), 2000, "bad")
+
+    def test_filtered_respects_max_points(self):
+        """Test the full range never exceeds max_points."""
+        for max_points in (50, 500, 2000):
+            response = client.get(f"/api/data/filtered?resample=10s&max_points={max_points}")
+            assert response.status_code == 200
+            assert len(response.json()["time_series"]) <= max_points
+
+    def test_filtered_narrow_range_uses_raw_resolution(self):
+        """Test a one-hour window is served at the native 10s resolution."""
+        response = client.get(
+            "/api/data/filtered?date_start=2026-02-06&date_end=2026-02-06&hour_start=15&hour_end=15"
+        )
+        data = response.json()
+        assert data["resolution"] == "10s"
+        assert len(data["time_series"]) == 360
+
+    def test_filtered_invalid_resample(self):
+        """Test an invalid resample string returns 400."""
+        response = client.get("/api/data/filtered?resample=bad")
+        assert response.status_code == 400
+
+
+# ===========================================================================
+# DELTA FETCH TESTS
+# ===========================================================================
+
+def _merge_delta(base: dict, delta: dict) -> dict:
+    """Apply a delta payload the same way the dashboard does."""
+    def merge(rows, updates, key):
+        merged = {key(r): r for r in rows}
+        merged.update({key(r): r for r in updates})
+        return [merged[k] for k in sorted(merged)]
+
+    return {
+        "time_series": merge(base["time_series"], delta["time_series"], lambda r: r["timestamp"]),
+        "heatmap": merge(base["heatmap"], delta["heatmap"], lambda r: (r["day"], r["hour"])),
+        "hourly_avg": merge(base["hourly_avg"], delta["hourly_avg"], lambda r: r["hour"]),
+        "kpis": delta["kpis"],
+    }
+
+
+class TestDeltaFetch:
+    """Tests for since=<cursor> delta responses on /api/data/filtered."""
+
+    URL = "/api/data/filtered?date_start=2026-02-06&date_end=2026-02-07&resample=1min&max_points=20000"
+
+    def test_full_response_has_cursor(self):
+        """Test a normal response carries a cursor and delta=false."""
+        data = client.get(self.URL).json()
+        assert data["delta"] is False
+        assert data["cursor"]
+
+    def test_delta_merge_matches_full(self):
+        """Test that merging a delta onto an older payload equals a fresh full payload."""
+        from app.data import filter_dataframe
+        full_df = filter_dataframe("2026-02-06", "2026-02-07")
+        cutoff = pd.Timestamp("2026-02-07 12:34:50", tz=full_df["timestamp"].dt.tz)
+
+        with patch("app.data.filter_dataframe", return_value=full_df[full_df["timestamp"] <= cutoff]):
+            old = client.get(self.URL).json()
+        delta = client.get(self.URL + f"&since={old['cursor']}").json()
+        full = client.get(self.URL).json()
+
+        assert delta["delta"] is True
+        assert len(delta["time_series"]) < len(full["time_series"]) / 2
+        merged = _merge_delta(old, delta)
+        assert [r["timestamp"] for r in merged["time_series"]] == [r["timestamp"] for r in full["time_series"]]
+        for got, want in zip(merged["time_series"], full["time_series"]):
+            assert {k: v for k, v in got.items() if k != "timestamp"} == pytest.approx(
+                {k: v for k, v in want.items() if k != "timestamp"}
+            )
+        assert merged["heatmap"] == sorted(full["heatmap"], key=lambda r: (r["day"], r["hour"]))
+        assert merged["hourly_avg"] == full["hourly_avg"]
+        assert merged["kpis"] == full["kpis"]
+        assert delta["cursor"] == full["cursor"]
+
+    def test_delta_with_current_cursor_is_small(self):
+        """Test polling with an up-to-date cursor returns only the last bucket."""
+        data = client.get(self.URL).json()
+        delta = client.get(self.URL + f"&since={data['cursor']}").json()
+        assert delta["delta"] is True
+        assert len(delta["time_series"]) == 1
+
+    def test_delta_without_stored_state(self):
+        """Test a cursor issued elsewhere (no stored aggregates) still gets a correct delta."""
+        import app.data as data
+
+        full = client.get(self.URL).json()
+        data._cursor_states.clear()
+        delta = client.get(self.URL + f"&since={full['cursor']}").json()
+        assert delta["delta"] is True
+        assert delta["kpis"] == full["kpis"]
+
+    def test_cursor_from_other_filters_returns_full(self):
+        """Test a cursor bound to different filters falls back to a full payload."""
+        other = client.get("/api/data/filtered?date_start=2026-02-01").json()
+        data = client.get(self.URL + f"&since={other['cursor']}").json()
+        assert data["delta"] is False
+
+    def test_invalid_cursor(self):
+        """Test a malformed cursor returns 400."""
+        response = client.get(self.URL + "&since=not-a-cursor")
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("scale", [1, 4])
+    def test_delta_work_does_not_grow_with_window(self, scale, tmp_path):
+        """Test a delta reads only the rows since the cursor's hour, whatever the window size."""
+        import app.data as data
+        from benchmarks.run import dataset_for_scale, use_dataset
+
+        original = data.PARQUET_PATH
+        use_dataset(dataset_for_scale(scale, tmp_path))
+        seen: list[int] = []
+        add = data.WindowAggregate.add
+
+        def record_add(agg, df):
+            seen.append(len(df))
+            return add(agg, df)
+
+        def record(fn):
+            return lambda df, *args, **kwargs: (seen.append(len(df)), fn(df, *args, **kwargs))[1]
+
+        try:
+            window = len(data.load_dataframe())
+            cursor = data.filtered_payload(resample="1min", max_points=10**6)["cursor"]
+            with patch("app.data.filter_dataframe", side_effect=AssertionError("full scan")), \
+                    patch.object(data.WindowAggregate, "add", record_add), \
+                    patch("app.data.build_time_series", record(data.build_time_series)), \
+                    patch("app.data.build_heatmap", record(data.build_heatmap)):
+                delta = data.filtered_payload(resample="1min", max_points=10**6, since=cursor)
+        finally:
+            use_dataset(original)
+
+        assert delta["delta"] is True
+        assert window > 60_000 * scale * 0.9
+        assert seen and max(seen) < 1_000
+
+
+# ===========================================================================
+# LIVE CHANNEL TESTS
+# ===========================================================================
+
+class TestLive:
+    """Tests for the /ws/live push channel."""
+
+    def test_running_kpis_match_batch_kpis(self):
+        """Test the incremental KPIs agree with compute_kpis on the dataset."""
+        from app.data import compute_kpis
+        from app.live import RunningKpis
+        df = load_dataframe()
+        running = RunningKpis(tail_limit=32)  # small limit: exercise tail merges too
+        running.add_many(df["value"].to_numpy()[:-100])
+        for value in df["value"].to_numpy()[-100:]:
+            running.add(float(value))
+        assert running.snapshot() == compute_kpis(df)
+
+    def test_seeded_hub_snapshot_matches_batch_kpis(self):
+        """Test the hub's KPI snapshot equals compute_kpis on the seeded dataset."""
+        from app.data import compute_kpis
+        from app.live import LiveHub
+
+        hub = LiveHub()
+        hub.seed(load_dataframe())
+        assert hub.kpis.snapshot() == compute_kpis(load_dataframe())
+
+    def test_uptime_counts_values_next_to_the_threshold(self):
+        """Test values just above the threshold count, values at it do not (no binning)."""
+        from app.data import compute_kpis
+        from app.live import RunningKpis
+
+        values = np.array([1000, 1001, 1002, 1500, 1999, 5000, 5001, 5002, 9000, 9001])
+        running = RunningKpis()
+        running.add_many(values[:5])
+        for value in values[5:]:
+            running.add(float(value))
+        expected = compute_kpis(pd.DataFrame({"value": values}))
+        assert running.snapshot()["uptime_pct"] == expected["uptime_pct"]
+        assert running._above(1500) == 6 and running._above(1499.5) == 7
+
+    def test_slow_subscriber_drops_oldest(self):
+        """Test a full subscriber queue drops old messages instead of blocking."""
+        from app.live import Subscriber
+        sub = Subscriber("10s", queue_size=2)
+        for i in range(5):
+            sub.offer(str(i))
+        assert sub.dropped == 3
+        assert [sub.queue.get_nowait(), sub.queue.get_nowait()] == ["3", "4"]
+
+    def test_websocket_receives_snapshot_and_updates(self):
+        """Test subscribers get a KPI snapshot, then one update per ingested point."""
+        with client.websocket_connect("/ws/live?resolution=1min") as ws:
+            snapshot = json.loads(ws.receive_text())
+            assert snapshot["type"] == "snapshot"
+            total = snapshot["kpis"]["total_records"]
+
+            response = client.post("/api/live/ingest", json={"points": [
+                {"timestamp": "2026-02-11 15:00:20", "value": 5100000},
+                {"timestamp": "2026-02-11 15:00:10", "value": 5000000},
+            ]})
+            assert response.status_code == 200
+
+            first = json.loads(ws.receive_text())
+            second = json.loads(ws.receive_text())
+            assert first["point"]["value"] == 5000000
+            assert second["bucket"]["timestamp"] == "2026-02-11 15:00:00+05:00"
+            assert second["bucket"]["mean"] == 5050000
+            assert second["kpis"]["total_records"] == total + 2
+
+    def test_ingest_rejects_negative_values(self):
+        """Test a negative store count is rejected instead of corrupting the KPIs."""
+        response = client.post("/api/live/ingest", json={"points": [
+            {"timestamp": "2026-02-11 15:00:30", "value": -1},
+        ]})
+        assert response.status_code == 422
+
+    @pytest.mark.parametrize("send_fails", [False, True])
+    def test_sender_is_awaited_on_disconnect(self, send_fails):
+        """Test the handler finishes its sender task (even one that failed) before returning."""
+        from starlette.websockets import WebSocketDisconnect
+        from app.main import live_updates
+
+        class Socket:
+            async def accept(self):
+                pass
+
+            async def send_text(self, message):
+                if send_fails:
+                    raise RuntimeError("socket closed")
+
+            async def receive_text(self):
+                await asyncio.sleep(0.05)
+                raise WebSocketDisconnect()
+
+        async def scenario():
+            await live_updates(Socket(), "10s")
+            return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+        assert asyncio.run(scenario()) == []
+
+    def test_websocket_rejects_unknown_resolution(self):
+        """Test an unsupported resolution closes the socket."""
+        from starlette.websockets import WebSocketDisconnect
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/ws/live?resolution=7min") as ws:
+                ws.receive_text()
+
+
+# ===========================================================================
+# SINGLE-FLIGHT TESTS
+# ===========================================================================
+
+class TestSingleFlight:
+    """Tests for coalescing of identical concurrent requests."""
+
+    def test_concurrent_identical_calls_share_one_execution(self):
+        """Test N concurrent callers with one key run the function once."""
+        from app.singleflight import SingleFlight
+
+        flight = SingleFlight()
+        runs = []
+        lock = threading.Lock()
+
+        def work(x):
+            with lock:
+                runs.append(x)
+            time.sleep(0.05)
+            return {"x": x}
+
+        async def main():
+            same = [flight.do("work", "a", work, 1) for _ in range(10)]
+            other = [flight.do("work", "b", work, 2)]
+            return await asyncio.gather(*same, *other)
+
+        results = asyncio.run(main())
+        assert results[:10] == [{"x": 1}] * 10
+        assert sorted(runs) == [1, 2]
+        assert flight.stats()["work"] == {"calls": 11, "executions": 2, "coalesced": 9, "inflight": 0}
+
+    def test_errors_are_shared_and_key_released(self):
+        """Test an exception reaches every waiter and the key is not stuck."""
+        from app.singleflight import SingleFlight
+
+        flight = SingleFlight()
+
+        def boom():
+            raise ValueError("bad")
+
+        async def main():
+            return await asyncio.gather(*[flight.do("f", 1, boom) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(main())
+        assert all(isinstance(r, ValueError) for r in results)
+        assert asyncio.run(flight.do("f", 1, lambda: "ok")) == "ok"
+
+    def test_normalize_query(self):
+        """Test query normalization ignores case and spacing."""
+        from app.singleflight import normalize_query
+        assert normalize_query("  Show   the Trend ") == normalize_query("show the trend")
+
+    def test_normalize_filters(self):
+        """Test equivalent dashboard filters share one canonical form."""
+        from app.data import normalize_filters
+
+        canonical = normalize_filters("2026-02-01", "2026-02-03", None, None, "1min")
+        assert normalize_filters("2026-2-1", "20260203", 0, 23, "60s") == canonical
+        assert normalize_filters(resample="10s") == normalize_filters()
+        assert normalize_filters(resample="5min")["resample"] == "5min"
+        assert normalize_filters("2026-02-01T06:00")["date_start"] == "2026-02-01T06:00:00"
+        with pytest.raises(ValueError):
+            normalize_filters(date_start="not-a-date")
+
+    def test_equivalent_filter_requests_coalesce(self):
+        """Test differently spelled filters share one execution and cursor."""
+        import httpx
+        from app.data import filtered_payload
+        from app.singleflight import single_flight
+
+        urls = [
+            "/api/data/filtered?date_start=2026-02-06&date_end=2026-02-06&resample=1min",
+            "/api/data/filtered?date_start=2026-2-6&date_end=2026-2-6&resample=60s&hour_start=0",
+        ]
+        before = single_flight.stats().get("data_filtered", {}).get("executions", 0)
+
+        def slow(*args, **kwargs):
+            time.sleep(0.2)  # keep the first call in flight while the second arrives
+            return filtered_payload(*args, **kwargs)
+
+        async def main():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+                return await asyncio.gather(*[c.get(url) for url in urls])
+
+        with patch("app.main.filtered_payload", slow):
+            first, second = asyncio.run(main())
+        assert first.json()["cursor"] == second.json()["cursor"]
+        assert single_flight.stats()["data_filtered"]["executions"] == before + 1
+        delta = client.get(urls[1] + f"&since={first.json()['cursor']}").json()
+        assert delta["delta"] is True
+        assert client.get("/api/data/filtered?date_start=nope").status_code == 400
+
+    def test_stats_endpoint(self):
+        """Test /api/stats exposes single-flight counters."""
+        client.get("/api/data/filtered?date_start=2026-02-01&date_end=2026-02-01")
+        data = client.get("/api/stats").json()
+        assert data["single_flight"]["data_filtered"]["calls"] >= 1
+
+
+# ===========================================================================
+# METRICS TESTS
+# ===========================================================================
+
+class TestMetrics:
+    """Tests for /metrics and Server-Timing instrumentation."""
+
+    def test_server_timing_header_has_stages(self):
+        """Test data_filtered responses report their processing stages."""
+        response = client.get("/api/data/filtered?date_start=2026-02-04&date_end=2026-02-04")
+        header = response.headers["server-timing"]
+        for name in ("filter", "time_series", "kpis", "heatmap", "hourly_avg", "total"):
+            assert f"{name};dur=" in header
+
+    def test_chart_stages_recorded(self):
+        """Test chart building records data_code, build and serialize stages."""
+        from app.metrics import STAGE_LATENCY
+        before = STAGE_LATENCY.count(stage="chart_serialize")
+        build_chart_from_spec({
+            "chart_type": "bar",
+            "data_code": "df.groupby('hour')['value'].mean().reset_index()",
+            "x": "hour",
+            "y": "value",
+        })
+        assert STAGE_LATENCY.count(stage="chart_serialize") == before + 1
+        assert STAGE_LATENCY.count(stage="data_code") > 0
+
+    @patch("langchain_openai.ChatOpenAI")
+    def test_llm_tokens_counted(self, mock_llm_cls):
+        """Test LLM usage metadata is added to the token counters."""
+        from app.agent import run_agent_query
+        from app.metrics import LLM_TOKENS
+        message = MagicMock()
+        message.content = '{"explanation": "ok", "chart_spec": null}'
+        message.usage_metadata = {"input_tokens": 120, "output_tokens": 30}
+        mock_llm_cls.return_value.invoke.return_value = message
+        before = LLM_TOKENS.value(kind="prompt")
+        result = run_agent_query("hello")
+        assert result["error"] is None
+        assert LLM_TOKENS.value(kind="prompt") == before + 120
+
+    def test_metrics_endpoint_prometheus_format(self):
+        """Test /metrics exposes histograms, cache and dataset gauges."""
+        client.get("/api/data/summary")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        assert "# TYPE http_request_duration_seconds histogram" in text
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/data/summary",status="200"}' in text
+        assert 'le="+Inf"' in text
+        assert 'cache_misses{cache="load_dataframe"}' in text
+        assert "dataset_load_seconds" in text
+
+
+# ===========================================================================
+# PROFILING TESTS
+# ===========================================================================
+
+class TestProfiling:
+    """Tests for opt-in per-request profiling."""
+
+    @pytest.fixture(autouse=True)
+    def _profiling_enabled(self, tmp_path, monkeypatch):
+        from app.profiling import profile_store
+        monkeypatch.setattr("app.profiling.PROFILE_TOKEN", "secret")
+        monkeypatch.setattr(profile_store, "directory", tmp_path)
+        monkeypatch.setattr(profile_store, "max_files", 3)
+
+    def test_flagged_request_is_profiled(self):
+        """Test a request with the token stores a profile with stages and a call tree."""
+        response = client.get("/api/data/filtered?date_start=2026-02-05", headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        profile_id = response.headers["x-profile-id"]
+
+        record = client.get(f"/debug/profiles/{profile_id}", headers={"X-Profile": "secret"}).json()
+        assert record["path"] == "/api/data/filtered"
+        assert record["status"] == 200
+        assert "heatmap" in record["stages_ms"]
+        assert record["call_tree"]["name"] == "<root>"
+
+    def test_query_flag_and_token_not_stored(self):
+        """Test the ?profile= flag works and the token is stripped from the record."""
+        response = client.get("/api/data/summary?profile=secret")
+        record = client.get(
+            f"/debug/profiles/{response.headers['x-profile-id']}", headers={"X-Profile": "secret"}
+        ).json()
+        assert "secret" not in record["query"]
+
+    def test_unflagged_or_wrong_token_not_profiled(self):
+        """Test requests without a valid token are not profiled."""
+        assert "x-profile-id" not in client.get("/api/data/summary").headers
+        assert "x-profile-id" not in client.get("/api/data/summary", headers={"X-Profile": "nope"}).headers
+
+    def test_is_authorized(self):
+        """Test the token check (constant-time) handles wrong, missing and non-ASCII tokens."""
+        from app.profiling import is_authorized
+
+        assert is_authorized("secret")
+        assert not is_authorized("secreT")
+        assert not is_authorized(None)
+        assert not is_authorized("sécret")
+
+    def test_ring_buffer_is_bounded(self):
+        """Test only the newest max_files profiles are kept."""
+        ids = [
+            client.get("/", headers={"X-Profile": "secret"}).headers["x-profile-id"]
+            for _ in range(5)
+        ]
+        listed = client.get("/debug/profiles", headers={"X-Profile": "secret"}).json()["profiles"]
+        assert [p["id"] for p in listed] == ids[::-1][:3]
+
+    def test_debug_endpoints_require_token(self):
+        """Test profile retrieval needs the token."""
+        assert client.get("/debug/profiles").status_code == 403
+        assert client.get("/debug/profiles/abc", headers={"X-Profile": "secret"}).status_code == 404
+
+
+# ===========================================================================
+# BENCHMARK SUITE TESTS
+# ===========================================================================
+
+class TestBenchmarks:
+    """Tests for the synthetic dataset generator and benchmark runner."""
+
+    def test_synthetic_keeps_schema_and_shape(self):
+        """Test synthetic data has the real dtypes, scaled length and hourly profile."""
+        from benchmarks.synthetic import generate
+
+        real = load_dataframe()
+        synth = generate(2, source=real)
+        assert list(synth.columns) == list(real.columns)
+        assert (synth.dtypes == real.dtypes).all()
+        assert synth["timestamp"].is_monotonic_increasing
+        assert synth["timestamp"].dt.date.nunique() == 2 * real["timestamp"].dt.date.nunique()
+        real_profile = real.groupby("hour")["value"].mean()
+        synth_profile = synth.groupby("hour")["value"].mean()
+        assert np.corrcoef(real_profile, synth_profile.reindex(real_profile.index))[0, 1] > 0.95
+
+    def test_chart_recipes_build(self):
+        """Test every SYSTEM_PROMPT recipe parses into a buildable chart spec."""
+        from benchmarks.run import chart_recipes
+
+        recipes = chart_recipes()
+        assert len(recipes) >= 5
+        for name, spec in recipes:
+            assert build_chart_from_spec(spec), name
+
+    def test_run_reports_metrics(self):
+        """Test the runner reports percentiles, memory and payload per case."""
+        from benchmarks.run import run
+        import app.data
+
+        report = run([1], repeats=1, only=["get_summary_text", "data_filtered.delta"])
+        assert report["meta"]["pandas"] == pd.__version__
+        names = {r["name"] for r in report["results"]}
+        assert names == {"get_summary_text", "data_filtered.delta"}
+        for result in report["results"]:
+            assert result["p50_ms"] <= result["p99_ms"]
+            assert result["payload_bytes"] > 0 and result["peak_mem_bytes"] > 0
+        assert app.data.PARQUET_PATH.endswith("availability_clean.parquet")
+
+
+# ===========================================================================
+# LOAD-TEST HARNESS TESTS
+# ===========================================================================
+
+class TestLoadHarness:
+    """Tests for the fake OpenAI server and the load driver."""
+
+    def _fake_client(self, **config):
+        from benchmarks.fake_llm import FakeLLMConfig, create_app
+
+        return TestClient(create_app(FakeLLMConfig(latency_ms=0, chunk_delay_ms=0, seed=0, **config)))
+
+    def test_fake_llm_returns_buildable_spec(self):
+        """Test non-streaming completions carry SYSTEM_PROMPT-conformant JSON."""
+        fake = self._fake_client(mix={"daily_avg": 1})
+        body = fake.post("/v1/chat/completions", json={
+            "model": "m", "messages": [{"role": "user", "content": "daily average"}],
+        }).json()
+        parsed = json.loads(body["choices"][0]["message"]["content"])
+        assert body["usage"]["total_tokens"] > 0
+        assert parsed["explanation"]
+        assert build_chart_from_spec(parsed["chart_spec"])
+
+    def test_fake_llm_streams_chunks(self):
+        """Test streamed chunks reassemble into the same JSON content."""
+        fake = self._fake_client(mix={"text": 1}, chunk_size=8)
+        response = fake.post("/v1/chat/completions", json={
+            "model": "m", "stream": True, "messages": [], "stream_options": {"include_usage": True},
+        })
+        events = [line[6:] for line in response.text.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        chunks = [json.loads(e) for e in events[:-1]]
+        content = "".join(c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"])
+        assert json.loads(content)["chart_spec"] is None
+        assert chunks[-1]["usage"]["completion_tokens"] > 0
+
+    def test_fake_llm_rejects_unknown_mix(self):
+        """Test mixes naming unknown recipes fail fast."""
+        with pytest.raises(ValueError):
+            self._fake_client(mix={"nope": 1})
+
+    def test_load_driver_reports(self):
+        """Test the driver replays the mix and reports latency and error rates."""
+        import httpx
+        from benchmarks.loadtest import run_load
+
+        chat_result = {"explanation": "ok", "chart_json": None, "error": "LLM returned invalid JSON"}
+        with patch("app.main.run_agent_query", return_value=chat_result):
+            report = asyncio.run(run_load(
+                "http://test", concurrency=4, total_requests=24,
+                mix={"filtered": 2, "delta": 1, "summary": 1, "chat": 1}, seed=3,
+                transport=httpx.ASGITransport(app=app),
+            ))
+        assert report["overall"]["requests"] == 24
+        assert report["overall"]["p50_ms"] <= report["overall"]["p99_ms"]
+        assert report["by_kind"]["chat"]["error_rate"] == 1.0
+        assert report["by_kind"]["filtered"]["error_rate"] == 0.0
+        # Delta requests resend their window, so the server answers with delta payloads
+        assert report["by_kind"]["delta"]["requests"] > 0
+        assert report["by_kind"]["delta"]["error_rate"] == 0.0
+
+    def test_chat_queries_cover_both_paths(self):
+        """Test the driver's routed questions hit the router and its LLM questions do not."""
+        from app.intents import can_route
+        from benchmarks.loadtest import LLM_QUERIES, ROUTED_QUERIES
+
+        assert all(can_route(q) for q in ROUTED_QUERIES)
+        assert not any(can_route(q) for q in LLM_QUERIES)
+
+    @patch("langchain_openai.ChatOpenAI")
+    def test_load_driver_splits_chat_paths(self, mock_llm):
+        """Test routed and LLM chat requests are counted and timed separately."""
+        import httpx
+        from benchmarks.loadtest import run_load
+
+        mock_llm.return_value.invoke.return_value = MagicMock(
+            content=json.dumps({"explanation": "ok", "chart_spec": None}), usage_metadata=None,
+        )
+        report = asyncio.run(run_load(
+            "http://test", concurrency=1, total_requests=20, mix={"chat": 1}, seed=5,
+            transport=httpx.ASGITransport(app=app), chat_llm_share=0.5,
+        ))
+        paths = report["chat_paths"]
+        assert paths["routed"]["requests"] + paths["llm"]["requests"] == 20
+        assert paths["llm"]["requests"] == mock_llm.return_value.invoke.call_count > 0
+        assert paths["routed"]["error_rate"] == paths["llm"]["error_rate"] == 0.0
+
+
+# ===========================================================================
+# INTENT ROUTER TESTS
+# ===========================================================================
+
+class TestIntentRouter:
+    """Tests for the fast-path intent router in front of the LLM."""
+
+    @pytest.mark.parametrize("query,intent", [
+        ("Show me the trend of visible stores over time", "trend"),
+        ("What's the average number of visible stores per hour?", "hourly_avg"),
+        ("Show the daily average of visible stores", "daily_avg"),
+        ("Which hour of the day has the most visible stores?", "peak_hour"),
+        ("Show me the distribution of values", "distribution"),
+        ("Compare the first 3 days vs the last 3 days", "compare_days"),
+        ("Show a heatmap of stores by day and hour", "heatmap"),
+        ("¿Cuál es el promedio de tiendas visibles por hora?", "hourly_avg"),
+        ("¿A qué hora hay más tiendas visibles?", "peak_hour"),
+        ("mapa de calor por día y hora", "heatmap"),
+        ("Compare the first three days with the last three days", "compare_days"),
+        ("Compara los 3 primeros días con los 3 últimos días", "compare_days"),
+        ("Show the hourly average as a bar chart", "hourly_avg"),
+    ])
+    def test_example_queries_match(self, query, intent):
+        """Test frontend examples and Spanish paraphrases are recognized."""
+        from app.intents import match_intent
+
+        assert match_intent(query)[0] == intent
+
+    @pytest.mark.parametrize("query", [
+        "What was the average on February 5?",
+        "Show hourly average only for weekends",
+        "Why did stores drop on the 10th?",
+        "Plot a box plot of values by hour",
+        "Which hour has the fewest visible stores?",
+        "What hour has the lowest availability?",
+        "¿A qué hora hay menos tiendas visibles?",
+        "Which hour is the quietest?",
+        "Show the daily minimum",
+        "Show the daily maximum",
+        "What is the median per hour?",
+        "Show the std of stores per day",
+        "Compare the first day with the last day",
+        "Compara el primer día con el último día",
+        "Compare the first days vs the last days",
+        "Compare the first 3 days vs the last 2 days",
+        "Show the hourly average for the first day",
+        "Show the daily average for the last day",
+        "What are the top hours?",
+        "Plot the hourly average as a line chart",
+        "Show the distribution as a pie chart",
+    ])
+    def test_constrained_queries_fall_through(self, query):
+        """Test questions with extra constraints are left to the LLM."""
+        from app.intents import match_intent
+
+        assert match_intent(query) is None
+
+    def test_router_can_be_disabled(self):
+        """Test INTENT_ROUTER_ENABLED=0 sends the example questions to the LLM."""
+        from app.intents import can_route
+
+        with patch("app.intents.INTENT_ROUTER_ENABLED", False):
+            assert can_route("Show the daily average of visible stores") is None
+        assert can_route("Show the daily average of visible stores") == ("daily_avg", 0)
+
+    @patch("langchain_openai.ChatOpenAI")
+    def test_routed_query_skips_llm(self, mock_llm):
+        """Test routed queries answer in the user's language without an LLM call."""
+        from app.agent import run_agent_query
+        from app.intents import router_stats
+
+        before = router_stats()["routed"]
+        result = run_agent_query("Muéstrame el promedio diario de tiendas visibles")
+        assert result["error"] is None
+        assert result["chart_json"]
+        assert "promedios diarios" in result["explanation"]
+        mock_llm.assert_not_called()
+        assert router_stats()["routed"] == before + 1
+
+    @patch("langchain_openai.ChatOpenAI")
+    def test_follow_ups_go_to_llm(self, mock_llm):
+        """Test questions referring back to the conversation are not routed."""
+        from app.agent import run_agent_query
+        from app.intents import route_query
+
+        history = [
+            {"role": "user", "content": "Which day had the biggest drop?"},
+            {"role": "assistant", "content": "February 10 had the biggest drop."},
+        ]
+        follow_up = "show me the average per hour for that day"
+        assert route_query(follow_up, history) is None
+        assert route_query("Show the daily average of visible stores", history)[0] == "daily_avg"
+
+        mock_llm.return_value.invoke.return_value = MagicMock(
+            content=json.dumps({"explanation": "Hourly averages on Feb 10.", "chart_spec": None}),
+            usage_metadata=None,
+        )
+        result = run_agent_query(follow_up, history)
+        assert result["explanation"] == "Hourly averages on Feb 10."
+        mock_llm.return_value.invoke.assert_called_once()
+
+    def test_compare_and_heatmap_charts(self):
+        """Test the compare and heatmap specs build valid charts."""
+        from app.intents import intent_answer
+
+        spec, explanation = intent_answer("compare_days", "en", 2)
+        chart = json.loads(build_chart_from_spec(spec))
+        assert {trace["name"] for trace in chart["data"]} == {"First 2 days", "Last 2 days"}
+        assert "first 2 days" in explanation
+        spec, _ = intent_answer("heatmap", "en", 0)
+        assert json.loads(build_chart_from_spec(spec))["data"][0]["type"] == "heatmap"
+
+
+# ===========================================================================
+# PROMPT SIZE TESTS
+# ===========================================================================
+
+class TestPromptBudget:
+    """Tests for history compaction and the stable system prompt prefix."""
+
+    def _history(self, turns: int) -> list[dict]:
+        history = []
+        for i in range(turns):
+            history.append({"role": "user", "content": f"question number {i} about visible stores " * 5})
+            history.append({"role": "assistant", "content": f"answer {i} " * 30, "chart": '{"data": []}'})
+        return history
+
+    def test_compaction_keeps_newest_within_budget(self):
+        """Test older turns are summarized and the newest fit the budget."""
+        from app.prompt import compact_history, count_tokens
+
+        summary, kept = compact_history(self._history(20), budget=300)
+        assert sum(count_tokens(m["content"]) for m in kept) <= 300
+        assert kept[-1]["content"].startswith("answer 19")
+        assert "question number 0" not in "".join(m["content"] for m in kept)
+        assert summary.startswith("Summary of earlier conversation")
+        assert all(set(m) == {"role", "content"} for m in kept)
+
+    def test_short_history_untouched(self):
+        """Test a history within budget is passed through without a summary."""
+        from app.prompt import compact_history
+
+        summary, kept = compact_history(self._history(1))
+        assert summary is None and len(kept) == 2
+
+    def test_chart_json_never_forwarded(self):
+        """Test raw agent responses and Plotly figures are reduced to text."""
+        from app.prompt import CHART_PLACEHOLDER, clean_content
+
+        raw = json.dumps({"explanation": "Peak is 17:00.", "chart_spec": {"chart_type": "bar"}})
+        assert clean_content(raw) == "Peak is 17:00."
+        assert clean_content(json.dumps({"data": [], "layout": {}})) == CHART_PLACEHOLDER
+        assert clean_content("{not json") == "{not json"
+
+    @patch("langchain_openai.ChatOpenAI")
+    def test_system_prefix_is_byte_stable(self, mock_llm_cls):
+        """Test every request starts with the identical system prompt and tokens are recorded."""
+        from app.agent import run_agent_query
+        from app.metrics import PROMPT_TOKENS
+
+        message = MagicMock()
+        message.content = '{"explanation": "ok", "chart_spec": null}'
+        message.usage_metadata = {}
+        mock_llm_cls.return_value.invoke.return_value = message
+        before = PROMPT_TOKENS.count(part="total")
+        run_agent_query("tell me something unusual", chat_history=self._history(2))
+        run_agent_query("and something else", chat_history=self._history(40))
+        first, second = (call.args[0] for call in mock_llm_cls.return_value.invoke.call_args_list)
+        assert first[0].content == second[0].content
+        assert "DATASET SUMMARY" in first[0].content
+        assert second[1].content.startswith("Summary of earlier conversation")
+        assert PROMPT_TOKENS.count(part="total") == before + 2
+
+
+# ===========================================================================
+# BATCH QUERY TESTS
+# ===========================================================================
+
+class TestBatchQuery:
+    """Tests for /api/query/batch."""
+
+    def _fake_agent(self, calls: list, active: list, peak: list, lock: threading.Lock):
+        def fake(query, chat_history=None, *, llm=None, df=None):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            calls.append((query, llm, df))
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            if query == "boom":
+                raise RuntimeError("exploded")
+            return {"explanation": f"answer to {query}", "chart_json": None, "error": None}
+        return fake
+
+    def test_collected_results_in_order_with_item_errors(self):
+        """Test results come back in request order and item failures stay local."""
+        calls, active, peak, lock = [], [0], [0], threading.Lock()
+        queries = [f"batch question {i}" for i in range(6)] + ["boom", "   "]
+        with patch("app.batch.run_agent_query", self._fake_agent(calls, active, peak, lock)), \
+                patch("app.batch.make_llm", return_value="shared-llm"):
+            response = client.post("/api/query/batch", json={"queries": queries, "concurrency": 2})
+        assert response.status_code == 200
+        body = response.json()
+        assert [r["index"] for r in body["results"]] == list(range(8))
+        assert body["count"] == 8 and body["errors"] == 2
+        assert body["results"][6]["error"] == "exploded"
+        assert body["results"][7]["error"] == "Query cannot be empty."
+        assert body["results"][0]["explanation"] == "answer to batch question 0"
+        assert peak[0] <= 2
+        assert {id(llm) for _, llm, _ in calls} == {id("shared-llm")}
+        assert len({id(df) for _, _, df in calls}) == 1
+
+    def test_streamed_results(self):
+        """Test streaming returns one NDJSON line per item then a done line."""
+        calls, active, peak, lock = [], [0], [0], threading.Lock()
+        with patch("app.batch.run_agent_query", self._fake_agent(calls, active, peak, lock)):
+            response = client.post("/api/query/batch", json={"queries": ["s1", "s2", "boom"], "stream": True})
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+        assert lines[-1] == {"done": True, "count": 3, "errors": 1, "duration_ms": lines[-1]["duration_ms"]}
+
+    def test_routed_queries_run_for_real(self):
+        """Test fast-path queries complete in a batch without an LLM."""
+        response = client.post("/api/query/batch", json={
+            "queries": ["Show me the distribution of values", "Show the daily average of visible stores"],
+        })
+        results = response.json()["results"]
+        assert all(r["error"] is None and r["chart_json"] for r in results)
+
+    def test_validation(self):
+        """Test empty and oversized batches are rejected."""
+        assert client.post("/api/query/batch", json={"queries": []}).status_code == 400
+        assert client.post("/api/query/batch", json={"queries": ["q"] * 51}).status_code == 400
+        assert client.post("/api/query/batch", json={"queries": ["q"], "concurrency": 0}).status_code == 400
+
+
+# ===========================================================================
+# ADMISSION CONTROL TESTS
+# ===========================================================================
+
+class TestAdmission:
+    """Tests for admission control, priority queueing and load shedding."""
+
+    def _controller(self, capacity=1, chat_inflight=1, chat_queue=2, timeout=5.0):
+        from app.admission import AdmissionController, Lane
+
+        return AdmissionController(capacity, [
+            Lane("data", 0, capacity, 8, timeout),
+            Lane("chat", 1, chat_inflight, chat_queue, timeout),
+        ])
+
+    def test_full_queue_is_shed_with_retry_after(self):
+        """Test requests beyond in-flight + queue limits are rejected with 429."""
+        from app.admission import Overloaded
+
+        async def scenario():
+            ctl = self._controller(capacity=4, chat_inflight=1, chat_queue=1)
+            await ctl.acquire("chat")
+            waiter = asyncio.ensure_future(ctl.acquire("chat"))
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded) as exc:
+                await ctl.acquire("chat")
+            assert exc.value.status_code == 429 and exc.value.retry_after >= 1
+            await ctl.acquire("data")  # chat cap leaves room for the dashboard
+            ctl.release("chat", 0.1)
+            await waiter
+            assert ctl.stats()["lanes"]["chat"]["inflight"] == 1
+
+        asyncio.run(scenario())
+
+    def test_data_lane_served_before_chat(self):
+        """Test queued dashboard requests are admitted ahead of earlier chat requests."""
+        async def scenario():
+            ctl = self._controller(capacity=1)
+            await ctl.acquire("data")
+            order = []
+
+            async def wait(lane):
+                await ctl.acquire(lane)
+                order.append(lane)
+
+            chat = asyncio.ensure_future(wait("chat"))
+            await asyncio.sleep(0)
+            data = asyncio.ensure_future(wait("data"))
+            await asyncio.sleep(0)
+            ctl.release("data")
+            await data
+            assert order == ["data"] and not chat.done()
+            ctl.release("data")
+            await chat
+            assert order == ["data", "chat"]
+
+        asyncio.run(scenario())
+
+    def test_deadline_and_cancel_free_the_queue(self):
+        """Test timed-out (503) and cancelled waiters leave the queue."""
+        from app.admission import Overloaded
+
+        async def scenario():
+            ctl = self._controller(capacity=1, chat_queue=1)
+            await ctl.acquire("chat")
+            with pytest.raises(Overloaded) as exc:
+                await ctl.acquire("chat", timeout=0.01)
+            assert exc.value.status_code == 503
+            waiter = asyncio.ensure_future(ctl.acquire("chat"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert ctl.stats()["lanes"]["chat"]["queued"] == 0
+            ctl.release("chat")
+            assert ctl.inflight == 0
+
+        asyncio.run(scenario())
+
+    def test_query_endpoint_sheds_but_fast_path_and_data_pass(self):
+        """Test /api/query returns 429 + Retry-After when chat is saturated."""
+        ctl = self._controller(capacity=4, chat_inflight=0, chat_queue=0)
+        with patch("app.main.admission", ctl):
+            shed = client.post("/api/query", json={"query": "tell me a story about the stores"})
+            routed = client.post("/api/query", json={"query": "Show me the distribution of values"})
+            # Matches a rule but route_query declines it (window too long): still LLM-bound
+            declined = client.post("/api/query", json={"query": "Compare the first 6 days vs the last 6 days"})
+            data = client.get("/api/data/summary")
+        assert shed.status_code == 429
+        assert declined.status_code == 429
+        assert int(shed.headers["retry-after"]) >= 1
+        assert routed.status_code == 200
+        assert data.status_code == 200
+
+
+# ===========================================================================
+# SHARED DATASET TESTS
+# ===========================================================================
+
+class TestSharedDataset:
+    """Tests for the memory-mapped dataset shared across workers."""
+
+    @pytest.fixture
+    def shared(self, tmp_path, monkeypatch):
+        import shutil
+        import app.data as data
+        import app.shared as shared
+
+        source = tmp_path / "source.parquet"
+        shutil.copy(data.PARQUET_PATH, source)
+        monkeypatch.setattr(data, "PARQUET_PATH", str(source))
+        monkeypatch.setattr(data, "SHARED_DATASET_DIR", str(tmp_path / "shared"))
+        monkeypatch.setattr(shared, "SHARED_POLL_SECONDS", 0)
+        data.reload_dataset()
+        yield shared
+        monkeypatch.undo()
+        data.reload_dataset()
+
+    @staticmethod
+    def _data_address(series: pd.Series) -> int:
+        """Address of a column's value buffer (numpy, tz-aware datetime or Arrow string)."""
+        import pyarrow as pa
+
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            return np.asarray(series.array.view("i8")).__array_interface__["data"][0]
+        if isinstance(series.dtype, pd.StringDtype):
+            chunks = pa.chunked_array(pa.array(series.array)).chunks
+            assert len(chunks) == 1
+            return chunks[0].buffers()[-1].address
+        return series.to_numpy().__array_interface__["data"][0]
+
+    def test_mapped_frame_is_zero_copy_view(self, shared):
+        """Test the shared frame equals the parquet one and every column lives in the file mapping."""
+        from pathlib import Path
+        from app.data import read_clean_dataframe
+
+        df = load_dataframe()
+        assert df.equals(read_clean_dataframe())
+        assert df.attrs["version"] == shared.current_version()
+        path = shared.dataset_file(df.attrs["version"])
+        assert path.exists()
+
+        maps = Path("/proc/self/maps")
+        if not maps.exists():
+            pytest.skip("needs /proc/self/maps")
+        ranges = []
+        for line in maps.read_text().splitlines():
+            if line.endswith(str(path.resolve())):
+                lo, hi = line.split()[0].split("-")
+                ranges.append((int(lo, 16), int(hi, 16)))
+        assert ranges
+        for column in df.columns:
+            address = self._data_address(df[column])
+            assert any(lo <= address < hi for lo, hi in ranges), column
+
+    def test_aggregates_come_from_metadata(self, shared):
+        """Test workers use the published intent aggregates and incident baseline instead of rebuilding them."""
+        import app.data as data
+        from app.data import read_clean_dataframe
+        from app.incidents import build_baseline, get_incident_detector
+        from app.intents import INTENTS, compute_intent_aggregates, intent_answer
+
+        fresh = read_clean_dataframe()
+        published = [intent_answer(i, "en", 3 if i == "compare_days" else 0) for i in INTENTS]
+        baseline = get_incident_detector().baseline
+        with patch("app.intents.compute_intent_aggregates") as intents, \
+                patch("app.incidents.build_baseline") as incidents:
+            data.reload_dataset()
+            assert [intent_answer(i, "en", 3 if i == "compare_days" else 0) for i in INTENTS] == published
+            get_incident_detector()
+        intents.assert_not_called()
+        incidents.assert_not_called()
+        np.testing.assert_array_equal(baseline, build_baseline(fresh))
+        assert shared.shared_aggregate("intents", shared.current_version()) == compute_intent_aggregates(fresh)
+
+    def test_reload_reseeds_live_hub(self, shared):
+        """Test a coordinated reload reseeds the live hub in place from the new dataset."""
+        import app.data as data
+        from app.live import get_live_hub
+
+        hub = get_live_hub()
+        assert hub.kpis.count == len(load_dataframe())
+        load_dataframe().iloc[:100].to_parquet(data.PARQUET_PATH)
+        assert shared.check_for_update()
+        assert get_live_hub() is hub
+        assert hub.kpis.count == 100
+
+    def test_socket_keeps_receiving_across_reload(self, shared):
+        """Test a connected /ws/live client still gets updates after a coordinated reload."""
+        import app.data as data
+
+        with client.websocket_connect("/ws/live?resolution=10s") as ws:
+            assert json.loads(ws.receive_text())["type"] == "snapshot"
+            load_dataframe().iloc[:100].to_parquet(data.PARQUET_PATH)
+            assert shared.check_for_update()
+
+            response = client.post("/api/live/ingest", json={"points": [
+                {"timestamp": "2026-02-11 15:00:10", "value": 5000000},
+            ]})
+            assert response.json()["subscribers"] == 1
+            # The test client runs the socket and the POST on separate event loops,
+            # so the reseed snapshot and the update may arrive in either order
+            messages = {m["type"]: m for m in (json.loads(ws.receive_text()) for _ in range(2))}
+        assert messages["snapshot"]["kpis"]["total_records"] == 100
+        assert messages["update"]["kpis"]["total_records"] == 101
+
+    def test_summary_comes_from_metadata(self, shared):
+        """Test the precomputed summary matches a fresh one (int hour keys included)."""
+        from app.data import read_clean_dataframe
+
+        summary = get_data_summary()
+        assert summary == get_data_summary(read_clean_dataframe())
+        assert summary is not get_data_summary()
+
+    def test_publish_is_idempotent_until_source_changes(self, shared):
+        """Test republishing and remapping after the source parquet changes."""
+        import app.data as data
+
+        before = load_dataframe()
+        version = before.attrs["version"]
+        assert shared.publish() == version
+        assert not shared.check_for_update()
+        assert load_dataframe() is before
+
+        before.iloc[: len(before) // 2].to_parquet(data.PARQUET_PATH)
+        assert shared.check_for_update()
+        after = load_dataframe()
+        assert after.attrs["version"] != version
+        assert len(after) == len(before) // 2
+        assert get_data_summary()["total_rows"] == len(after)
+
+
+# ===========================================================================
+# STARTUP / READINESS TESTS
+# ===========================================================================
+
+class TestStartup:
+    """Tests for lazy imports, the startup warm-up and the /ready probe."""
+
+    def test_import_skips_plotly_and_langchain(self):
+        """Test importing app.main loads neither Plotly nor LangChain."""
+        import subprocess
+        import sys
+
+        code = "import sys, app.main; print(sorted({m.split('.')[0] for m in sys.modules} & {'plotly', 'langchain_core', 'langchain_openai'}))"
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        assert out.strip().splitlines()[-1] == "[]"
+
+    def test_ready_probe_reports_warmup(self):
+        """Test /ready is 503 before warm-up and 200 with step timings after."""
+        from app.warmup import Readiness
+
+        fresh = Readiness()
+        with patch("app.main.readiness", fresh):
+            starting = client.get("/ready")
+            with TestClient(app) as c:
+                assert c.get("/").status_code == 200
+                deadline = time.time() + 60
+                while not fresh.ready and time.time() < deadline:
+                    time.sleep(0.05)
+                done = c.get("/ready")
+        assert starting.status_code == 503
+        assert starting.json()["status"] == "starting"
+        assert done.status_code == 200
+        body = done.json()
+        assert body["status"] == "ready" and body["time_to_ready_s"] > 0
+        assert set(body["steps_s"]) == {"dataset", "summary", "dashboard", "intents", "incidents", "chart"}
+
+    def test_failed_warmup_stays_unready(self):
+        """Test a failing step is reported and readiness never flips."""
+        from app.warmup import Readiness, warm_up
+
+        fresh = Readiness()
+        with patch("app.data.load_dataframe", side_effect=OSError("disk gone")):
+            warm_up(fresh)
+        assert not fresh.ready
+        assert fresh.status()["status"] == "failed"
+        assert "dataset: disk gone" in fresh.status()["error"]
+
+    def test_benchmark_measures_startup(self):
+        """Test the benchmark reports import, warm-up and time-to-ready from fresh processes."""
+        from benchmarks.run import STARTUP_CASES, measure_startup
+        from app.config import PARQUET_PATH
+
+        cases = measure_startup(PARQUET_PATH, repeats=1)
+        assert set(cases) == set(STARTUP_CASES)
+        assert cases["startup.time_to_ready"]["p50_ms"] > cases["startup.import"]["p50_ms"] > 0
+        assert cases["startup.warmup"]["peak_mem_bytes"] > 0